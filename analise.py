@@ -0,0 +1,408 @@
+# Dados, cubo e gráficos do dashboard. Fica fora de dashboard_clientes.py para que a tela de
+# login não pague a importação de pandas, pyarrow e plotly (ver aquecer_analise lá).
+
+import logging
+import time
+
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+import carga
+from atualizador import Atualizador
+from base import montar, rotulo_mes
+from cubo import Filtro
+from figuras import LAYOUT, CacheFiguras, MetricasRerun
+from incremental import CHAVE_CLIENTE, CargaIncremental
+from instrumentacao import medir, registro
+
+CORES_NIVEL = {
+    "1ª Compra":   "#d63aad",
+    "2ª Compra":   "#a855b5",
+    "3ª Compra":   "#7c5cbf",
+    "4ª Compra":   "#5b6fcf",
+    "5ª Compra +": "#3b82d4",
+}
+GRADIENTE = ["#d63aad", "#a855b5", "#7c5cbf", "#5b6fcf", "#3b82d4"]
+CORES_GENERO = {"Feminino": "#d63aad", "Masculino": "#5b6fcf"}
+ORDEM_NIVEIS = ["Todos", "1ª Compra", "2ª Compra", "3ª Compra", "4ª Compra", "5ª Compra +"]
+# Filtros da barra abaixo do nível (multiselect, chave filtro_<dimensão>), na ordem em que aparecem
+FILTROS = {"estado": "🗺️ Estado", "cidade": "🏙️ Cidade", "genero": "🚻 Gênero", "faixa": "🎂 Faixa Etária"}
+
+CORES_FAIXAS = {
+    "Menor de 20": "#f9a8d4",
+    "20 – 29":     "#d63aad",
+    "30 – 39":     "#a855b5",
+    "40 – 49":     "#7c5cbf",
+    "50 – 59":     "#5b6fcf",
+    "60+":         "#3b82d4",
+}
+
+log = logging.getLogger(__name__)
+
+# ============================================================
+# DADOS
+# ============================================================
+
+def fonte_dados():
+    # GOOGLE_DRIVE_URL: um link, ou uma lista de links quando o export vem em fragmentos;
+    # GOOGLE_DRIVE_MANIFESTO: link de um arquivo texto com os links dos fragmentos, um por linha
+    url = st.secrets.get("GOOGLE_DRIVE_URL")
+    manifesto = st.secrets.get("GOOGLE_DRIVE_MANIFESTO")
+    if isinstance(url, str) and not manifesto:
+        return url
+    return carga.Fragmentos(
+        urls=list(url or []),
+        manifesto=manifesto,
+        downloads=st.secrets.get("DOWNLOADS_SIMULTANEOS", 4),
+        processos=st.secrets.get("PROCESSOS_LEITURA"),
+    )
+
+@st.cache_resource
+def atualizador_dados():
+    diretorio = st.secrets.get("SNAPSHOT_DIR", ".cache/snapshots")
+    if st.secrets.get("MOTOR_CONSULTA", "pandas") == "duckdb":
+        # Base maior que a RAM: fica em Parquet no disco e as agregações rodam no DuckDB
+        import consulta_duckdb
+        armazem = consulta_duckdb.ArmazemParquet(diretorio)
+        return Atualizador(
+            consulta_duckdb.CargaDuckDB(fonte_dados(), armazem),
+            intervalo=st.secrets.get("INTERVALO_ATUALIZACAO", 300),
+            inicial=consulta_duckdb.montar(carga.snapshot_local(armazem)),
+        ).iniciar()
+
+    store = carga.SnapshotStore(diretorio)
+    # GOOGLE_DRIVE_DELTA_URL: um link ou lista de links de CSVs só com os clientes alterados
+    urls_delta = st.secrets.get("GOOGLE_DRIVE_DELTA_URL", [])
+    carregar = CargaIncremental(
+        fonte_dados(), store,
+        urls_delta=[urls_delta] if isinstance(urls_delta, str) else urls_delta,
+        chave=st.secrets.get("CHAVE_CLIENTE", CHAVE_CLIENTE),
+        recarga_a_cada=st.secrets.get("RECARGA_COMPLETA_A_CADA", 24),
+    )
+    return Atualizador(
+        carregar,
+        intervalo=st.secrets.get("INTERVALO_ATUALIZACAO", 300),
+        inicial=montar(carga.snapshot_local(store)),
+    ).iniciar()
+
+def carregar_dados():
+    return atualizador_dados().atual()
+
+# ============================================================
+# GRÁFICOS
+# ============================================================
+# Cada função monta uma figura a partir do cubo; o layout comum vem do template em figuras.py.
+# Os rótulos das barras usam texttemplate sobre x/y em vez de repetir os valores num array `text`.
+
+def fig_nivel(cubo, filtro):
+    # Todos os níveis sob os demais filtros, com o nível escolhido em destaque
+    contagem = cubo.agregar(["classificacao"], filtro.sem("classificacao"))["clientes"].reindex(ORDEM_NIVEIS[1:]).reset_index()
+    contagem.columns = ["classificacao", "total"]
+    fig = px.bar(contagem, x="classificacao", y="total",
+                 color="classificacao", color_discrete_map=CORES_NIVEL)
+    destaque = dict(filtro.selecoes).get("classificacao")
+    if destaque:
+        for trace in fig.data:
+            trace.opacity = 1.0 if trace.name in destaque else 0.2
+    fig.update_traces(texttemplate="%{y:,}", textposition="outside",
+                      hovertemplate="<b>%{x}</b><br>Clientes: %{y:,}<extra></extra>")
+    fig.update_layout(showlegend=False, margin=dict(t=40, b=10), xaxis_title="", yaxis_title="Clientes")
+    return fig
+
+def fig_top(cubo, dimensao, filtro):
+    top = cubo.agregar([dimensao], filtro)["clientes"].sort_values(ascending=False, kind="stable").head(15).reset_index()
+    top.columns = [dimensao, "total"]
+    fig = px.bar(top, x="total", y=dimensao, orientation="h",
+                 color="total", color_continuous_scale=GRADIENTE)
+    fig.update_traces(texttemplate="%{x:,}", textposition="outside",
+                      hovertemplate="<b>%{y}</b><br>Clientes: %{x:,}<extra></extra>")
+    fig.update_layout(coloraxis_showscale=False, yaxis=dict(categoryorder="total ascending"),
+                      margin=dict(t=10, b=10, r=60), yaxis_title="", xaxis_title="")
+    return fig
+
+def fig_evolucao(cubo, filtro):
+    evolucao = cubo.agregar(["mes"], filtro)["clientes"].tail(24)
+    evolucao = pd.DataFrame({"mes": rotulo_mes(evolucao.index), "total": evolucao.values})
+    fig = px.line(evolucao, x="mes", y="total", markers=True, line_shape="spline")
+    fig.update_traces(line_color="#d63aad",
+                      marker=dict(color="#7c5cbf", size=7, line=dict(color="white", width=2)),
+                      fill="tozeroy", fillcolor="rgba(214,58,173,0.06)",
+                      hovertemplate="<b>%{x}</b><br>Clientes: %{y:,}<extra></extra>")
+    fig.update_layout(xaxis=dict(tickangle=-45), margin=dict(t=10, b=60), xaxis_title="", yaxis_title="Clientes")
+    return fig
+
+def fig_genero(gen):
+    gen_df = gen.reset_index()
+    gen_df.columns = ["genero", "total"]
+    fig = px.pie(gen_df, names="genero", values="total",
+                 color="genero", color_discrete_map=CORES_GENERO, hole=0.55)
+    fig.update_traces(texttemplate="%{label}<br><b>%{percent}</b>",
+                      hovertemplate="<b>%{label}</b><br>Clientes: %{value:,}<extra></extra>")
+    fig.update_layout(showlegend=False, margin=dict(t=10, b=10))
+    return fig
+
+def fig_gen_faixa(cubo, filtro):
+    gen_faixa = cubo.agregar(["faixa", "genero"], filtro)["clientes"].reset_index(name="total")
+    fig = px.bar(gen_faixa, x="faixa", y="total", color="genero", barmode="group",
+                 color_discrete_map=CORES_GENERO)
+    fig.update_traces(texttemplate="%{y:,}", textposition="outside",
+                      hovertemplate="<b>%{x}</b> · %{fullData.name}<br>Clientes: %{y:,}<extra></extra>")
+    fig.update_layout(legend=dict(title="", orientation="h", y=1.08),
+                      margin=dict(t=40, b=10), xaxis_title="", yaxis_title="Clientes")
+    return fig
+
+def fig_top_faixas(cubo, filtro):
+    # Pedidos ausentes contam como zero, como antes
+    media_compras = cubo.agregar(["faixa"], filtro)[["pedidos", "clientes"]].reset_index()
+    media_compras["media"] = (media_compras["pedidos"] / media_compras["clientes"]).round(2)
+    fig = px.bar(media_compras, x="faixa", y="media",
+                 color="media", color_continuous_scale=GRADIENTE)
+    fig.update_traces(
+        texttemplate="%{y:.2f}", textposition="outside",
+        hovertemplate="<b>%{x}</b><br>Média de compras: %{y:.2f}<br>Clientes: %{customdata[0]:,}<extra></extra>",
+        customdata=media_compras[["clientes"]].values,
+    )
+    fig.update_layout(coloraxis_showscale=False,
+                      margin=dict(t=30, b=10), xaxis_title="", yaxis_title="Média de Pedidos")
+    return fig
+
+def fig_nivel_faixa(cubo, filtro):
+    nivel_faixa = cubo.agregar(["faixa", "classificacao"], filtro)["clientes"].reset_index(name="total")
+    fig = px.bar(nivel_faixa, x="faixa", y="total", color="classificacao",
+                 color_discrete_map=CORES_NIVEL, barmode="stack")
+    fig.update_traces(texttemplate="%{y:,}", textposition="inside",
+                      hovertemplate="<b>%{x}</b> · %{fullData.name}<br>Clientes: %{y:,}<extra></extra>")
+    fig.update_layout(legend=dict(title="", orientation="h", y=-0.2),
+                      margin=dict(t=30, b=80), xaxis_title="", yaxis_title="Clientes")
+    return fig
+
+def fig_evolucao_faixa(cubo, filtro):
+    evolucao_faixa = cubo.agregar(["mes", "faixa"], filtro)["clientes"].reset_index(name="total")
+    ultimos_meses = sorted(evolucao_faixa["mes"].unique())[-24:]
+    evolucao_faixa = evolucao_faixa[evolucao_faixa["mes"].isin(ultimos_meses)]
+    evolucao_faixa["mes"] = rotulo_mes(evolucao_faixa["mes"])
+    fig = px.line(evolucao_faixa, x="mes", y="total", color="faixa",
+                  color_discrete_map=CORES_FAIXAS, markers=True, line_shape="spline")
+    fig.update_traces(marker=dict(size=5, line=dict(color="white", width=1)),
+                      hovertemplate="<b>%{fullData.name}</b><br>%{x}<br>Clientes: %{y:,}<extra></extra>")
+    fig.update_layout(legend=dict(title="Faixa Etária", orientation="h", y=-0.2),
+                      xaxis=dict(tickangle=-45),
+                      margin=dict(t=20, b=80), xaxis_title="", yaxis_title="Novos Clientes")
+    return fig
+
+@st.cache_resource
+def cache_figuras():
+    # Compartilhado entre sessões: a mesma figura serve a todos que olham a mesma seleção
+    return CacheFiguras(st.secrets.get("CACHE_FIGURAS_MB", 64) * 1024 * 1024)
+
+def plotar(chave, base, filtro, montar, metricas):
+    with medir(f"grafico.{chave}"):
+        fig, _ = cache_figuras().obter((base.versao, filtro, chave), lambda: montar().update_layout(**LAYOUT), metricas)
+        st.plotly_chart(fig, key=chave)
+
+# ============================================================
+# SEÇÕES
+# ============================================================
+# O painel é um fragmento: trocar o nível ou um filtro reexecuta só ele, sem refazer cabeçalho, logo e login.
+# Gênero e Público-Alvo ficam em expanders e só montam seus gráficos quando abertos.
+
+@st.fragment
+def painel():
+    inicio = time.perf_counter()
+    tempos = st.session_state.tempos_painel = {}
+    # Acertos no cache de figuras e bytes de gráficos enviados ao navegador neste rerun
+    metricas = st.session_state.metricas_figuras = MetricasRerun()
+
+    # Base lida de novo a cada execução do fragmento para pegar a versão mais recente
+    _, base = carregar_dados()
+    registro.definir(versao=base.versao[:16], linhas=len(base), motor=st.secrets.get("MOTOR_CONSULTA", "pandas"))
+    nivel = st.radio("🎯 **Filtrar por Nível de Compra**", options=ORDEM_NIVEIS, horizontal=True, key="nivel_radio")
+
+    filtro = barra_filtros(base, nivel)
+
+    st.markdown("<br>", unsafe_allow_html=True)
+
+    totais = secao(tempos, "kpis", secao_kpis, base, filtro)
+    if totais["clientes"] == 0:
+        st.info("Nenhum cliente com essa combinação de filtros.")
+    else:
+        secao(tempos, "graficos", secao_graficos, base, filtro, metricas)
+
+        if "genero" in base.cubo.dimensoes:
+            st.divider()
+            gen = st.expander("🚻 Distribuição por Gênero", expanded=True, key="exp_genero", on_change="rerun")
+            with gen:
+                if gen.open:
+                    secao(tempos, "genero", secao_genero, base, filtro, metricas)
+
+        if {"faixa", "genero", "classificacao"}.issubset(base.cubo.dimensoes):
+            st.divider()
+            pub = st.expander("🎯 Análise de Público-Alvo", key="exp_publico", on_change="rerun")
+            with pub:
+                if pub.open:
+                    secao(tempos, "publico", secao_publico, base, filtro, totais, metricas)
+
+    tempos["total"] = time.perf_counter() - inicio
+    registro.registrar("painel", tempos["total"])
+    log.debug("Painel em %.3fs %s; figuras: %d do cache, %d montadas, %d bytes enviados",
+              tempos["total"], tempos, metricas.acertos, metricas.faltas, metricas.bytes)
+
+    if st.session_state.get("usuario_logado") in st.secrets.get("admins", []):
+        with st.expander("⚙️ Desempenho (admin)"):
+            secao_desempenho(base, tempos, metricas)
+
+    exportar_metricas()
+
+def barra_filtros(base, nivel):
+    # Filtros combinados com o nível; a seleção fica na sessão e opções que sumiram da base saem dela
+    cubo = base.cubo
+    dimensoes = [d for d in FILTROS if d in cubo.dimensoes]
+    selecoes = {"classificacao": None if nivel == "Todos" else nivel}
+    for coluna, dimensao in zip(st.columns(len(dimensoes)) if dimensoes else [], dimensoes):
+        # Cidades ficam restritas aos estados escolhidos
+        restricao = Filtro.de(estado=selecoes.get("estado")) if dimensao == "cidade" else None
+        opcoes = list(cubo.agregar([dimensao], restricao).index)
+        chave = f"filtro_{dimensao}"
+        if chave in st.session_state:
+            validas = set(opcoes)
+            st.session_state[chave] = [v for v in st.session_state[chave] if v in validas]
+        with coluna:
+            selecoes[dimensao] = st.multiselect(FILTROS[dimensao], opcoes, key=chave, placeholder="Todos")
+    return Filtro.de(**selecoes)
+
+def secao(tempos, nome, funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    tempos[nome] = time.perf_counter() - inicio
+    registro.registrar(f"secao.{nome}", tempos[nome])
+    return resultado
+
+def secao_kpis(base, filtro):
+    # Tudo abaixo sai do cubo pré-agregado; trocar o nível é só uma consulta em cache
+    totais = base.cubo.totais(filtro)
+
+    col1, col2, col3, col4 = st.columns(4)
+    for col, valor, label in [
+        (col1, totais["clientes"], "Total de Clientes"),
+        (col2, totais["compraram"], "Compraram ao menos 1x"),
+        (col3, totais["recorrentes"], "Clientes Recorrentes"),
+        (col4, totais["so_cancelamentos"], "Só Cancelamentos"),
+    ]:
+        with col:
+            st.markdown(f"""
+                <div class="metric-card">
+                    <div class="metric-value">{valor:,}</div>
+                    <div class="metric-label">{label}</div>
+                </div>
+            """, unsafe_allow_html=True)
+
+    st.markdown("<br>", unsafe_allow_html=True)
+    return totais
+
+def secao_graficos(base, filtro, metricas):
+    cubo = base.cubo
+    col_esq, col_dir = st.columns(2)
+
+    with col_esq:
+        st.markdown("### 🛒 Nível de Compra")
+        plotar("chart_nivel", base, filtro, lambda: fig_nivel(cubo, filtro), metricas)
+
+    with col_dir:
+        st.markdown("### 🗺️ Clientes por Estado")
+        plotar("chart_estados", base, filtro, lambda: fig_top(cubo, "estado", filtro), metricas)
+
+    col_esq2, col_dir2 = st.columns(2)
+
+    with col_esq2:
+        st.markdown("### 📈 Novos Clientes por Mês")
+        plotar("chart_evolucao", base, filtro, lambda: fig_evolucao(cubo, filtro), metricas)
+
+    with col_dir2:
+        st.markdown("### 🏙️ Top 15 Cidades")
+        plotar("chart_cidades", base, filtro, lambda: fig_top(cubo, "cidade", filtro), metricas)
+
+def secao_genero(base, filtro, metricas):
+    col_g1, col_g2 = st.columns([1, 3])
+
+    with col_g1:
+        gen = base.cubo.agregar(["genero"], filtro)["clientes"].sort_values(ascending=False, kind="stable")
+        total_gen = gen.sum()
+        for label, valor in gen.items():
+            pct = valor / total_gen * 100
+            st.markdown(f"""
+                <div class="metric-card" style="margin-bottom:12px">
+                    <div class="metric-value">{pct:.1f}%</div>
+                    <div class="metric-label">{label}</div>
+                </div>
+            """, unsafe_allow_html=True)
+
+    with col_g2:
+        plotar("chart_genero", base, filtro, lambda: fig_genero(gen), metricas)
+
+def secao_publico(base, filtro, totais, metricas):
+    cubo = base.cubo
+
+    # Clientes sem faixa (sem data de nascimento ou idade fora de 14–100) ficam fora dos agrupamentos
+    total_pub = cubo.agregar(["faixa"], filtro)["clientes"].sum()
+    st.caption(f"Base com data de nascimento válida: **{total_pub:,} clientes** ({total_pub/totais['clientes']*100:.1f}% do total filtrado)")
+    st.markdown("<br>", unsafe_allow_html=True)
+
+    # Gênero x Faixa etária
+    st.markdown("### 👥 Gênero por Faixa Etária")
+    plotar("chart_gen_faixa", base, filtro, lambda: fig_gen_faixa(cubo, filtro), metricas)
+
+    st.markdown("<br>", unsafe_allow_html=True)
+
+    col_a, col_b = st.columns(2)
+
+    with col_a:
+        st.markdown("### 🏆 Top Faixas que Mais Compram")
+        plotar("chart_top_faixas", base, filtro, lambda: fig_top_faixas(cubo, filtro), metricas)
+
+    with col_b:
+        st.markdown("### 🛒 Nível de Compra por Faixa Etária")
+        plotar("chart_nivel_faixa", base, filtro, lambda: fig_nivel_faixa(cubo, filtro), metricas)
+
+    st.markdown("<br>", unsafe_allow_html=True)
+
+    # Evolução do público ao longo do tempo
+    st.markdown("### 📅 Evolução do Público por Faixa Etária")
+    plotar("chart_evolucao_faixa", base, filtro, lambda: fig_evolucao_faixa(cubo, filtro), metricas)
+
+def secao_desempenho(base, tempos, metricas):
+    # Só para os usuários em st.secrets["admins"]: tempos deste rerun e acumulados do processo
+    spans, contadores, info = registro.resumo()
+    st.caption(f"Base `{info.get('versao')}` · {len(base):,} linhas · motor {info.get('motor')}")
+
+    col_rerun, col_contadores = st.columns(2)
+    with col_rerun:
+        st.markdown("**Este rerun**")
+        st.dataframe(pd.DataFrame({"seção": list(tempos), "ms": [round(s * 1000, 1) for s in tempos.values()]}),
+                     hide_index=True)
+        st.caption(f"Figuras: {metricas.acertos} do cache, {metricas.faltas} montadas, "
+                   f"{metricas.bytes / 1024:,.0f} KB enviados")
+    with col_contadores:
+        st.markdown("**Contadores do processo**")
+        st.dataframe(pd.DataFrame({"evento": list(contadores), "total": list(contadores.values())}),
+                     hide_index=True)
+
+    st.markdown("**Etapas desde o início do processo**")
+    etapas = pd.DataFrame([
+        {"etapa": nome, "execuções": span.contagem, "último ms": span.ultimo * 1000,
+         "médio ms": span.total / span.contagem * 1000, "máximo ms": span.maximo * 1000,
+         "total s": span.total}
+        for nome, span in spans.items()
+    ])
+    if not etapas.empty:
+        st.dataframe(etapas.sort_values("total s", ascending=False).round({"último ms": 1, "médio ms": 1, "máximo ms": 1, "total s": 3}),
+                     hide_index=True)
+
+@st.cache_resource
+def exportar_metricas():
+    # METRICAS_ARQUIVO: arquivo no formato texto do Prometheus (textfile collector); "" desliga.
+    # Reescrito em segundo plano a cada INTERVALO_METRICAS segundos, nunca por clique
+    caminho = st.secrets.get("METRICAS_ARQUIVO", ".cache/metricas.prom")
+    if not caminho:
+        return None
+    return registro.exportar_a_cada(caminho, st.secrets.get("INTERVALO_METRICAS", 15))
@@ -0,0 +1,18 @@
+# Escrita em disco compartilhada (snapshot, ativos, métricas); módulo leve, sem pandas
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def escrita_atomica(destino):
+    # Escreve num temporário da mesma pasta e troca com os.replace só se o bloco terminar:
+    # quem lê nunca encontra um arquivo pela metade
+    fd, temporario = tempfile.mkstemp(dir=os.path.dirname(destino) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as arquivo:
+            yield arquivo
+        os.replace(temporario, destino)
+    except BaseException:
+        os.unlink(temporario)
+        raise
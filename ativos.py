@@ -0,0 +1,88 @@
+import hashlib
+import io
+import json
+import os
+
+import requests
+
+from arquivos import escrita_atomica
+from atualizador import Atualizador
+
+
+def _gravar(caminho, dados):
+    with escrita_atomica(caminho) as destino:
+        destino.write(dados)
+
+
+def redimensionar(conteudo, larguras):
+    """Gera um PNG por largura, mantendo a proporção da imagem original."""
+    from PIL import Image
+
+    original = Image.open(io.BytesIO(conteudo))
+    original.load()
+    if original.mode not in ("RGB", "RGBA"):
+        original = original.convert("RGBA")
+    variantes = {}
+    for largura in larguras:
+        altura = max(1, round(original.height * largura / original.width))
+        saida = io.BytesIO()
+        original.resize((largura, altura), Image.LANCZOS).save(saida, format="PNG", optimize=True)
+        variantes[largura] = saida.getvalue()
+    return variantes
+
+
+class ImagemRemota:
+    """Imagem baixada uma vez, guardada em disco já nos tamanhos usados e servida da memória.
+
+    A renovação roda em segundo plano (Atualizador); quem pede a imagem espera no máximo
+    `espera` segundos pela primeira carga e, se ela não chegar ou já tiver falhado, recebe
+    None. Sem cópia em disco, uma falha é tentada de novo em `repetir` segundos (com backoff).
+    """
+
+    def __init__(self, url, diretorio, nome, larguras, timeout=10, intervalo=3600, repetir=30):
+        self.url = url
+        self.diretorio = diretorio
+        self.nome = nome
+        self.larguras = tuple(larguras)
+        self.timeout = timeout
+        self._atualizador = Atualizador(self._carregar, intervalo, inicial=self._ler_disco(), repetir=repetir)
+
+    def iniciar(self):
+        self._atualizador.iniciar()
+        return self
+
+    def imagem(self, largura, espera=2):
+        variantes = self._atualizador.atual(espera)
+        return None if variantes is None else variantes["png"][largura]
+
+    def _caminho(self, sufixo):
+        return os.path.join(self.diretorio, f"{self.nome}{sufixo}")
+
+    def _ler_disco(self):
+        try:
+            with open(self._caminho(".json")) as f:
+                meta = json.load(f)
+            if meta["larguras"] != list(self.larguras):
+                return None
+            png = {}
+            for largura in self.larguras:
+                with open(self._caminho(f"-{largura}.png"), "rb") as f:
+                    png[largura] = f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+        return {"sha256": meta["sha256"], "png": png}
+
+    def _carregar(self, anterior):
+        resposta = requests.get(self.url, timeout=self.timeout)
+        resposta.raise_for_status()
+        sha256 = hashlib.sha256(resposta.content).hexdigest()
+        if anterior is not None and anterior["sha256"] == sha256:
+            return anterior
+
+        png = redimensionar(resposta.content, self.larguras)
+        os.makedirs(self.diretorio, exist_ok=True)
+        for largura, dados in png.items():
+            _gravar(self._caminho(f"-{largura}.png"), dados)
+        meta = {"sha256": sha256, "larguras": list(self.larguras)}
+        _gravar(self._caminho(".json"), json.dumps(meta).encode())
+        return {"sha256": sha256, "png": png}
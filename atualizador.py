@@ -0,0 +1,101 @@
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class _Voo:
+    # Uma busca em andamento; quem chega depois espera por ela em vez de baixar de novo
+    def __init__(self):
+        self.fim = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+class Atualizador:
+    """Mantém um único snapshot por processo e o renova em segundo plano.
+
+    `carregar(anterior)` é chamado no máximo uma vez por vez (single-flight) e recebe
+    o valor atual para poder reaproveitá-lo; o resultado só substitui o atual depois
+    de totalmente processado. Com `repetir`, uma falha é tentada de novo depois de
+    `repetir` segundos, dobrando a cada falha seguida até `intervalo`.
+    """
+
+    def __init__(self, carregar, intervalo, inicial=None, repetir=None):
+        self._carregar = carregar
+        self._intervalo = intervalo
+        self._repetir = repetir or intervalo
+        self._atual = inicial
+        self._pronto = threading.Event()
+        if inicial is not None:
+            self._pronto.set()
+        self._tentou = threading.Event()  # a primeira tentativa já terminou, com ou sem sucesso
+        self._trava = threading.Lock()
+        self._voo = None
+        self._parar = threading.Event()
+        self._thread = None
+
+    def atual(self, espera=None):
+        # Só bloqueia se ainda não existe nenhum dado (primeira carga sem snapshot em disco).
+        # Com `espera`, aguarda por no máximo esse tempo a carga em andamento (ou a primeira, que
+        # ainda vai começar) e pode devolver None; depois de uma falha, sem carga rodando, não espera.
+        snapshot = self._atual
+        if snapshot is None:
+            if espera is not None:
+                voo = self._voo
+                if voo is not None:
+                    voo.fim.wait(espera)
+                elif not self._tentou.is_set():
+                    self._tentou.wait(espera)
+                return self._atual
+            snapshot = self.atualizar()
+        return snapshot
+
+    def atualizar(self):
+        with self._trava:
+            voo = self._voo
+            dono = voo is None
+            if dono:
+                voo = self._voo = _Voo()
+
+        if not dono:
+            voo.fim.wait()
+            if voo.erro is not None:
+                raise voo.erro
+            return voo.resultado
+
+        try:
+            voo.resultado = self._carregar(self._atual)
+            self._atual = voo.resultado
+            self._pronto.set()
+            return voo.resultado
+        except Exception as e:
+            voo.erro = e
+            raise
+        finally:
+            with self._trava:
+                self._voo = None
+            self._tentou.set()
+            voo.fim.set()
+
+    def iniciar(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="atualizador-dados", daemon=True)
+            self._thread.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+
+    def _loop(self):
+        falhas = 0
+        while True:
+            try:
+                self.atualizar()
+                falhas = 0
+            except Exception:
+                falhas += 1
+                log.exception("Falha ao atualizar os dados em segundo plano")
+            espera = min(self._intervalo, self._repetir * 2 ** (falhas - 1)) if falhas else self._intervalo
+            if self._parar.wait(espera):
+                return
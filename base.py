@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+
+from carga import concatenar
+from cubo import Cubo
+from instrumentacao import medir
+
+ORDEM_FAIXAS = ["Menor de 20", "20 – 29", "30 – 39", "40 – 49", "50 – 59", "60+"]
+LIMITES_FAIXAS = [14, 20, 30, 40, 50, 60, 101]  # idades fora de 14–100 ficam sem faixa
+COLUNAS_DERIVADAS = ["idade", "faixa", "mes"]
+
+
+class ErroSomenteLeitura(TypeError):
+    pass
+
+
+def _bloquear(*args, **kwargs):
+    raise ErroSomenteLeitura(
+        "A base de clientes é compartilhada entre todas as sessões e não pode ser alterada. "
+        "Derive um novo DataFrame (ex.: df.assign(...)) em vez de modificar este."
+    )
+
+
+class _IndexadorLeitura:
+    def __init__(self, indexador):
+        self._indexador = indexador
+
+    def __call__(self, *args, **kwargs):
+        return _IndexadorLeitura(self._indexador(*args, **kwargs))
+
+    def __getitem__(self, chave):
+        return self._indexador[chave]
+
+    __setitem__ = _bloquear
+
+
+class FrameSomenteLeitura(pd.DataFrame):
+    # Qualquer operação que gere um novo frame (filtros, copy, assign...) volta a ser um DataFrame comum;
+    # com copy-on-write do pandas esses frames derivados não compartilham escrita com o original.
+
+    @property
+    def _constructor(self):
+        return pd.DataFrame
+
+    @property
+    def loc(self):
+        return _IndexadorLeitura(super().loc)
+
+    @property
+    def iloc(self):
+        return _IndexadorLeitura(super().iloc)
+
+    @property
+    def at(self):
+        return _IndexadorLeitura(super().at)
+
+    @property
+    def iat(self):
+        return _IndexadorLeitura(super().iat)
+
+    def __setattr__(self, nome, valor):
+        if nome in ("columns", "index"):
+            _bloquear()
+        super().__setattr__(nome, valor)
+
+    __setitem__ = _bloquear
+    __delitem__ = _bloquear
+    insert = _bloquear
+    pop = _bloquear
+    update = _bloquear
+
+
+def _sem_inplace(nome):
+    original = getattr(pd.DataFrame, nome)
+
+    def metodo(self, *args, **kwargs):
+        if kwargs.get("inplace"):
+            _bloquear()
+        return original(self, *args, **kwargs)
+
+    metodo.__name__ = nome
+    metodo.__doc__ = original.__doc__
+    return metodo
+
+
+for _nome in ("fillna", "replace", "drop", "dropna", "drop_duplicates", "rename", "set_index", "reset_index",
+              "sort_values", "sort_index", "where", "mask", "clip", "interpolate", "ffill", "bfill", "query", "eval"):
+    setattr(FrameSomenteLeitura, _nome, _sem_inplace(_nome))
+
+
+def somente_leitura(df):
+    if isinstance(df, FrameSomenteLeitura):
+        return df
+    return FrameSomenteLeitura(df)
+
+
+# ============================================================
+# COLUNAS DERIVADAS
+# ============================================================
+
+def _normalizar(serie, maiusculas=False):
+    # Trabalha sobre as categorias (poucas) e não sobre as linhas; vazio vira NA
+    serie = serie.astype("category")
+    limpas = serie.cat.categories.astype(str).str.strip()
+    if maiusculas:
+        limpas = limpas.str.upper()
+    mapa = dict(zip(serie.cat.categories, limpas.where(limpas != "")))
+    limpa = serie.map(mapa, na_action="ignore").astype("category")
+    return limpa.cat.reorder_categories(sorted(limpa.cat.categories))
+
+@medir("base.derivar")
+def derivar(df, hoje=None):
+    hoje = hoje or pd.Timestamp.now()
+    novas = {}
+    if "data_nascimento" in df.columns:
+        idade = np.trunc((hoje - df["data_nascimento"]).dt.days / 365.25).astype("Int16")
+        novas["idade"] = idade
+        novas["faixa"] = pd.cut(idade, bins=LIMITES_FAIXAS, right=False, labels=ORDEM_FAIXAS, ordered=True)
+    if "atualizado_em" in df.columns:
+        # Chave inteira AAAAMM: ordena certo e agrupa bem mais rápido que strings de período
+        novas["mes"] = (df["atualizado_em"].dt.year * 100 + df["atualizado_em"].dt.month).astype("Int32")
+    if "estado" in df.columns:
+        novas["estado"] = _normalizar(df["estado"], maiusculas=True)
+    if "cidade" in df.columns:
+        novas["cidade"] = _normalizar(df["cidade"])
+    return df.assign(**novas)
+
+def rotulo_mes(meses):
+    return [f"{m // 100}-{m % 100:02d}" for m in meses]
+
+
+def _marca_dagua(df):
+    if "atualizado_em" not in df.columns or df["atualizado_em"].isna().all():
+        return None
+    return df["atualizado_em"].max()
+
+
+class BaseClientes:
+    """Uma versão imutável da base de clientes, mantida uma única vez por processo.
+
+    Todas as sessões leem o mesmo objeto; nada é copiado ou desserializado por rerun.
+    As colunas derivadas (idade, faixa, mes, estado/cidade limpos) e o cubo de agregados
+    são calculados aqui, uma vez.
+    """
+
+    def __init__(self, df, versao):
+        self.df = somente_leitura(derivar(df))
+        self.cubo = Cubo(self.df)
+        self.versao = versao
+        self.marca_dagua = _marca_dagua(self.df)
+
+    @medir("base.com_delta")
+    def com_delta(self, delta, chave, versao):
+        """Nova versão com os clientes do delta inseridos ou atualizados pela `chave`.
+
+        Só entram linhas mais novas que a marca d'água, então reaplicar o mesmo delta não
+        muda nada. Apenas as linhas do delta são derivadas e apenas as células do cubo
+        que elas tocam são recalculadas.
+        """
+        esperadas = set(self.df.columns) - set(COLUNAS_DERIVADAS)
+        if chave not in delta.columns or set(delta.columns) != esperadas:
+            raise ValueError(f"Delta com colunas diferentes da base: {sorted(set(delta.columns) ^ (esperadas | {chave}))}")
+        if self.marca_dagua is not None:
+            delta = delta[delta["atualizado_em"] > self.marca_dagua]
+        if delta.empty:
+            return self
+
+        delta = delta.sort_values("atualizado_em").drop_duplicates(chave, keep="last")
+        novos = derivar(delta)[list(self.df.columns)]
+        afetados = self.df[chave].isin(novos[chave])
+
+        nova = BaseClientes.__new__(BaseClientes)
+        nova.df = somente_leitura(concatenar([self.df[~afetados], novos]))
+        nova.cubo = self.cubo.com_delta(self.df[afetados], novos)
+        nova.versao = versao
+        nova.marca_dagua = max((m for m in (self.marca_dagua, _marca_dagua(novos)) if m is not None), default=None)
+        return nova
+
+    def __len__(self):
+        return len(self.df)
+
+
+def montar(snapshot, anterior=None):
+    # Colunas derivadas e cubo só são recalculados quando a versão dos dados muda
+    if snapshot is None:
+        return None
+    if anterior is not None and anterior[1].versao == snapshot.versao:
+        return snapshot, anterior[1]
+    return snapshot, BaseClientes(snapshot.dados, snapshot.versao)
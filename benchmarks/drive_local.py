@@ -0,0 +1,150 @@
+"""Servidor HTTP local que imita o `uc?export=download` do Google Drive.
+
+Serve arquivos do disco em streaming, com ETag/Last-Modified e 304, e conta os downloads;
+`apontar()` faz o dashboard (drive.url_download) baixar daqui em vez do Drive no mesmo
+processo; para um `streamlit run` separado, use os secrets que o comando abaixo imprime.
+
+    python -m benchmarks.drive_local .cache/benchmarks/clientes-1000000.csv --porta 8765
+    python -m benchmarks.drive_local fragmento-*.csv --banda-mb-s 20
+"""
+import argparse
+import email.utils
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import drive
+
+TAMANHO_BLOCO = 1 << 20
+TAMANHO_BLOCO_LIMITADO = 64 << 10
+
+
+def etag(caminho):
+    # Barato e estável: muda quando o arquivo é regravado
+    info = os.stat(caminho)
+    return '"' + hashlib.sha1(f"{info.st_size}:{info.st_mtime_ns}".encode()).hexdigest() + '"'
+
+
+class _Tratador(BaseHTTPRequestHandler):
+    def do_GET(self):
+        servidor = self.server.drive
+        consulta = urlparse(self.path)
+        id_arquivo = parse_qs(consulta.query).get("id", [""])[0]
+        caminho = servidor.arquivos.get(id_arquivo)
+        if consulta.path != "/uc" or caminho is None:
+            self.send_error(404)
+            return
+        if servidor.falhar.get(id_arquivo):
+            servidor.falhar[id_arquivo] -= 1
+            self.send_error(503)
+            return
+
+        marca = etag(caminho)
+        if self.headers.get("If-None-Match") == marca:
+            servidor.contar("nao_modificado")
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        servidor.contar("downloads", id_arquivo)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(os.path.getsize(caminho)))
+        self.send_header("ETag", marca)
+        self.send_header("Last-Modified", email.utils.formatdate(os.path.getmtime(caminho), usegmt=True))
+        self.end_headers()
+        with open(caminho, "rb") as origem:
+            if not servidor.banda:
+                shutil.copyfileobj(origem, self.wfile, TAMANHO_BLOCO)
+                return
+            # Limite por conexão, para simular a rede: downloads simultâneos somam banda
+            inicio = time.perf_counter()
+            enviados = 0
+            while bloco := origem.read(TAMANHO_BLOCO_LIMITADO):
+                self.wfile.write(bloco)
+                enviados += len(bloco)
+                time.sleep(max(0.0, enviados / servidor.banda - (time.perf_counter() - inicio)))
+
+    def log_message(self, *args):
+        pass
+
+
+class DriveLocal:
+    """Arquivos servidos por id: `adicionar(caminho)` devolve um link no formato do Drive."""
+
+    def __init__(self, host="127.0.0.1", porta=0, banda=None):
+        self.arquivos = {}
+        self.falhar = {}  # id -> quantas requisições seguidas respondem 503
+        self.banda = banda  # bytes/s por conexão; None = sem limite
+        self.contadores = {"downloads": 0, "nao_modificado": 0}
+        self.downloads_por_arquivo = Counter()
+        self._trava = threading.Lock()
+        self._http = ThreadingHTTPServer((host, porta), _Tratador)
+        self._http.daemon_threads = True
+        self._http.drive = self
+
+    @property
+    def url_download(self):
+        host, porta = self._http.server_address[:2]
+        return f"http://{host}:{porta}/uc?export=download&id={{file_id}}"
+
+    def adicionar(self, caminho, id_arquivo=None):
+        id_arquivo = id_arquivo or hashlib.sha1(os.path.abspath(caminho).encode()).hexdigest()[:20]
+        self.arquivos[id_arquivo] = caminho
+        return f"https://drive.google.com/file/d/{id_arquivo}/view?usp=sharing"
+
+    def contar(self, nome, id_arquivo=None):
+        with self._trava:
+            self.contadores[nome] += 1
+            if nome == "downloads":
+                self.downloads_por_arquivo[id_arquivo] += 1
+
+    def iniciar(self):
+        threading.Thread(target=self._http.serve_forever, name="drive-local", daemon=True).start()
+        return self
+
+    def parar(self):
+        self._http.shutdown()
+        self._http.server_close()
+
+    @contextmanager
+    def apontar(self):
+        # Redireciona drive.url_download para este servidor enquanto o bloco roda
+        original = drive.DRIVE_DOWNLOAD_URL
+        drive.DRIVE_DOWNLOAD_URL = self.url_download
+        try:
+            yield self
+        finally:
+            drive.DRIVE_DOWNLOAD_URL = original
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("arquivos", nargs="+")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--banda-mb-s", type=float, help="limite por conexão, em MB/s")
+    args = parser.parse_args()
+
+    servidor = DriveLocal(args.host, args.porta, args.banda_mb_s and args.banda_mb_s * 1024 * 1024)
+    links = [servidor.adicionar(caminho) for caminho in args.arquivos]
+    # Pronto para colar no .streamlit/secrets.toml; vários arquivos viram os fragmentos da base
+    print(f'DRIVE_DOWNLOAD_URL = "{servidor.url_download}"')
+    if len(links) == 1:
+        print(f'GOOGLE_DRIVE_URL = "{links[0]}"')
+    else:
+        print("GOOGLE_DRIVE_URL = [" + ", ".join(f'"{link}"' for link in links) + "]")
+    try:
+        servidor._http.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
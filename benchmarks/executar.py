@@ -0,0 +1,185 @@
+"""Mede carga e seções do dashboard em bases sintéticas de vários tamanhos.
+
+Para cada escala: gera o CSV (uma vez, em --dados), sobe o Drive local e, num processo
+novo, baixa e interpreta o arquivo pelo mesmo caminho do dashboard (carga + base + cubo ou
+DuckDB), depois monta os dados e figuras de cada seção para todos os níveis. Os resultados
+vão para um JSON lines com o commit, para comparar execuções entre versões.
+
+    python -m benchmarks.executar                      # 100k, 1M e 10M linhas
+    python -m benchmarks.executar --linhas 100000 --motor duckdb
+    python -m benchmarks.executar --comparar
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Fora do código: .cache/ está no .gitignore
+RESULTADOS = os.path.join(RAIZ, ".cache", "benchmarks", "resultados.jsonl")
+ESCALAS = [100_000, 1_000_000, 10_000_000]
+
+
+def _pico_rss_mb():
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _secoes(cubo, nivel):
+    # Mesmos dados e figuras que analise.painel monta em cada seção, sem desenhar nada
+    import analise
+    from cubo import Filtro
+
+    filtro = Filtro.de(classificacao=None if nivel == "Todos" else nivel)
+    genero = lambda: cubo.agregar(["genero"], filtro)["clientes"].sort_values(ascending=False, kind="stable")
+    return {
+        "kpis": lambda: [cubo.totais(filtro)],
+        "graficos": lambda: [analise.fig_nivel(cubo, filtro), analise.fig_top(cubo, "estado", filtro),
+                             analise.fig_evolucao(cubo, filtro), analise.fig_top(cubo, "cidade", filtro)],
+        "genero": lambda: [analise.fig_genero(genero())],
+        "publico": lambda: [cubo.agregar(["faixa"], filtro), analise.fig_gen_faixa(cubo, filtro),
+                            analise.fig_top_faixas(cubo, filtro), analise.fig_nivel_faixa(cubo, filtro),
+                            analise.fig_evolucao_faixa(cubo, filtro)],
+    }
+
+
+def _executar_secao(calcular):
+    inicio = time.perf_counter()
+    for resultado in calcular():
+        if hasattr(resultado, "to_json"):
+            resultado.to_json()  # a serialização também faz parte do custo de enviar o gráfico
+    return time.perf_counter() - inicio
+
+
+def medir(caminho_csv, motor):
+    """Roda no processo filho: uma carga completa e as seções para cada nível."""
+    import analise
+    import carga
+    from base import montar
+    from benchmarks.drive_local import DriveLocal
+    from instrumentacao import registro
+
+    servidor = DriveLocal().iniciar()
+    url = servidor.adicionar(caminho_csv)
+    rss_inicial = _pico_rss_mb()
+    with tempfile.TemporaryDirectory() as pasta, servidor.apontar():
+        inicio = time.perf_counter()
+        if motor == "duckdb":
+            import consulta_duckdb
+            base = carga.carregar_com_snapshot(url, consulta_duckdb.ArmazemParquet(pasta)).dados
+        else:
+            _, base = montar(carga.carregar_com_snapshot(url, carga.SnapshotStore(pasta)))
+        carga_s = time.perf_counter() - inicio
+        pico_carga = _pico_rss_mb()
+
+        secoes = {}
+        for nivel in analise.ORDEM_NIVEIS:
+            for rodada in ("frio", "quente"):
+                for nome, calcular in _secoes(base.cubo, nivel).items():
+                    secoes.setdefault(nome, {"frio": [], "quente": []})[rodada].append(_executar_secao(calcular))
+        linhas = len(base)
+    servidor.parar()
+
+    spans, contadores, _ = registro.resumo()
+    return {
+        "linhas": linhas,
+        "motor": motor,
+        "carga_s": round(carga_s, 3),
+        "etapas_s": {nome: round(span.total, 3) for nome, span in sorted(spans.items())
+                     if not nome.startswith("consulta.")},
+        "rss_inicial_mb": round(rss_inicial),
+        "pico_rss_carga_mb": round(pico_carga - rss_inicial),
+        "pico_rss_mb": round(_pico_rss_mb() - rss_inicial),
+        # Médias por nível: "frio" é a primeira vez (agregação + figura), "quente" já com o cubo em cache
+        "secoes_ms": {nome: {rodada: round(sum(t) / len(t) * 1000, 2) for rodada, t in tempos.items()}
+                      for nome, tempos in secoes.items()},
+        "downloads": servidor.contadores["downloads"],
+        "consultas": {nome: valor for nome, valor in contadores.items() if nome.startswith("consultas.")},
+    }
+
+
+def csv_sintetico(diretorio, linhas):
+    # Gerado uma vez e reaproveitado; num subprocesso, para não pesar no processo que mede
+    caminho = os.path.join(diretorio, f"clientes-{linhas}.csv")
+    if not os.path.exists(caminho):
+        print(f"Gerando {caminho}...", file=sys.stderr)
+        subprocess.run([sys.executable, "-m", "benchmarks.gerar_csv", str(linhas), caminho], cwd=RAIZ, check=True)
+    return caminho
+
+
+def guardar_resultado(caminho, resultado):
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    with open(caminho, "a", encoding="utf-8") as f:
+        f.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+
+
+def _commit():
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=RAIZ, capture_output=True, text=True).stdout.strip()
+    commit = git("rev-parse", "--short", "HEAD") or "desconhecido"
+    return commit + ("+" if git("status", "--porcelain", "--untracked-files=no") else "")
+
+
+def _imprimir(resultados):
+    print(f"{'commit':<10} {'motor':<7} {'linhas':>11} {'carga s':>8} {'pico MB':>8} "
+          f"{'kpis':>7} {'gráficos':>9} {'gênero':>7} {'público':>8}  (ms por nível, frio)")
+    for r in resultados:
+        secoes = r["secoes_ms"]
+        print(f"{r['commit']:<10} {r['motor']:<7} {r['linhas']:>11,} {r['carga_s']:>8.2f} {r['pico_rss_mb']:>8} "
+              f"{secoes['kpis']['frio']:>7.1f} {secoes['graficos']['frio']:>9.1f} "
+              f"{secoes['genero']['frio']:>7.1f} {secoes['publico']['frio']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--linhas", type=int, nargs="+", default=ESCALAS)
+    parser.add_argument("--motor", choices=["pandas", "duckdb"], default="pandas")
+    parser.add_argument("--dados", default=os.path.join(RAIZ, ".cache", "benchmarks"),
+                        help="onde os CSVs gerados ficam guardados entre execuções")
+    parser.add_argument("--resultados", default=RESULTADOS)
+    parser.add_argument("--comparar", action="store_true", help="só mostra os resultados já salvos")
+    parser.add_argument("--medir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        print(json.dumps(medir(args.medir, args.motor)))
+        return
+
+    if args.comparar:
+        with open(args.resultados, encoding="utf-8") as f:
+            resultados = [json.loads(linha) for linha in f if linha.strip()]
+        _imprimir(sorted(resultados, key=lambda r: (r["motor"], r["linhas"], r["data"])))
+        return
+
+    commit = _commit()
+    resultados = []
+    for linhas in args.linhas:
+        caminho = csv_sintetico(args.dados, linhas)
+
+        # Processo novo por escala, e nada pesado neste: no Linux o ru_maxrss do pai passa
+        # para o filho no exec, e o pico de uma medição contaminaria a seguinte
+        filho = subprocess.run(
+            [sys.executable, "-m", "benchmarks.executar", "--medir", caminho, "--motor", args.motor],
+            cwd=RAIZ, capture_output=True, text=True,
+        )
+        if filho.returncode != 0:
+            sys.exit(f"Falha medindo {linhas:,} linhas:\n{filho.stderr}")
+        resultado = json.loads(filho.stdout.strip().splitlines()[-1])
+        resultado.update(commit=commit, data=datetime.now().isoformat(timespec="seconds"),
+                         python=platform.python_version())
+        resultados.append(resultado)
+
+        guardar_resultado(args.resultados, resultado)
+
+    _imprimir(resultados)
+
+
+if __name__ == "__main__":
+    main()
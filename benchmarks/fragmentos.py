@@ -0,0 +1,151 @@
+"""Compara a carga de uma base em fragmentos: serial, paralela e como arquivo único.
+
+Divide o CSV sintético em N fragmentos, serve tudo pelo Drive local (opcionalmente com banda
+limitada por conexão, como numa rede de verdade) e mede, cada modo num processo novo:
+- "unico": o arquivo inteiro, pelo caminho de sempre;
+- "serial": um download e uma leitura por vez;
+- "paralelo": downloads simultâneos e leitura em processos (um por CPU, ou --processos).
+No arquivo único a leitura acontece durante o download, então só o total é comparável.
+A base montada é conferida contra a do arquivo único (linhas e hash do conteúdo).
+
+    python -m benchmarks.fragmentos --linhas 1000000 --fragmentos 8
+    python -m benchmarks.fragmentos --fragmentos 8 --banda-mb-s 20
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.executar import RAIZ, _commit, _pico_rss_mb, csv_sintetico, guardar_resultado
+
+RESULTADOS = os.path.join(RAIZ, ".cache", "benchmarks", "resultados-fragmentos.jsonl")
+MODOS = ["unico", "serial", "paralelo"]
+
+
+def dividir(caminho_csv, n, diretorio):
+    """Fragmentos com o cabeçalho do original e linhas inteiras, na ordem; gerados uma vez."""
+    nome = os.path.splitext(os.path.basename(caminho_csv))[0]
+    destinos = [os.path.join(diretorio, f"{nome}-parte{i + 1}de{n}.csv") for i in range(n)]
+    if all(os.path.exists(d) for d in destinos):
+        return destinos
+
+    por_parte = os.path.getsize(caminho_csv) // n + 1
+    with open(caminho_csv, "rb") as origem:
+        cabecalho = origem.readline()
+        for i, destino in enumerate(destinos):
+            with open(destino, "wb") as saida:
+                # Só o primeiro leva o BOM do UTF-8, como num export de verdade
+                saida.write(cabecalho if i == 0 else cabecalho.removeprefix(b"\xef\xbb\xbf"))
+                escritos = 0
+                while escritos < por_parte and (linha := origem.readline()):
+                    saida.write(linha)
+                    escritos += len(linha)
+    return destinos
+
+
+def medir(modo, caminhos, motor, banda, processos):
+    """Roda no processo filho: uma carga completa no modo pedido."""
+    import pandas as pd
+
+    import carga
+    from benchmarks.drive_local import DriveLocal
+    from instrumentacao import registro
+
+    servidor = DriveLocal(banda=banda).iniciar()
+    links = [servidor.adicionar(caminho) for caminho in caminhos]
+    if modo == "unico":
+        fonte = links[0]
+    else:
+        fonte = carga.Fragmentos(links, downloads=1 if modo == "serial" else len(links),
+                                 processos=1 if modo == "serial" else processos)
+
+    rss_inicial = _pico_rss_mb()
+    with tempfile.TemporaryDirectory() as pasta, servidor.apontar():
+        if motor == "duckdb":
+            import consulta_duckdb
+            store = consulta_duckdb.ArmazemParquet(pasta)
+        else:
+            store = carga.SnapshotStore(pasta)
+        inicio = time.perf_counter()
+        snapshot = carga.carregar_com_snapshot(fonte, store)
+        carga_s = time.perf_counter() - inicio
+        linhas = len(snapshot.dados)
+        if motor == "duckdb":
+            conteudo = str(snapshot.dados.agregar(["estado", "classificacao"]).to_dict())
+        else:
+            conteudo = str(pd.util.hash_pandas_object(snapshot.dados, index=False).sum())
+    servidor.parar()
+
+    spans, _, _ = registro.resumo()
+    return {
+        "modo": modo,
+        "motor": motor,
+        "fragmentos": len(caminhos),
+        "carga_s": round(carga_s, 3),
+        "etapas_s": {nome: round(span.total, 3) for nome, span in sorted(spans.items())},
+        "pico_rss_mb": round(_pico_rss_mb() - rss_inicial),
+        "linhas": linhas,
+        "conteudo": conteudo,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--fragmentos", type=int, default=8)
+    parser.add_argument("--motor", choices=["pandas", "duckdb"], default="pandas")
+    parser.add_argument("--banda-mb-s", type=float, help="limite por conexão no Drive local, em MB/s")
+    parser.add_argument("--processos", type=int, help="processos de leitura no modo paralelo (padrão: um por CPU)")
+    parser.add_argument("--dados", default=os.path.join(RAIZ, ".cache", "benchmarks"))
+    parser.add_argument("--resultados", default=RESULTADOS)
+    parser.add_argument("--medir", choices=MODOS, help=argparse.SUPPRESS)
+    parser.add_argument("--arquivos", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    banda = args.banda_mb_s and args.banda_mb_s * 1024 * 1024
+
+    if args.medir:
+        print(json.dumps(medir(args.medir, args.arquivos, args.motor, banda, args.processos)))
+        return
+
+    caminho = csv_sintetico(args.dados, args.linhas)
+    fragmentos = dividir(caminho, args.fragmentos, args.dados)
+    extras = {"commit": _commit(), "data": datetime.now().isoformat(timespec="seconds"),
+              "python": platform.python_version(), "cpus": os.cpu_count(), "banda_mb_s": args.banda_mb_s, "processos": args.processos}
+
+    resultados = []
+    for modo in MODOS:
+        filho = subprocess.run(
+            [sys.executable, "-m", "benchmarks.fragmentos", "--medir", modo, "--motor", args.motor,
+             *([] if banda is None else ["--banda-mb-s", str(args.banda_mb_s)]),
+             *([] if args.processos is None else ["--processos", str(args.processos)]),
+             "--arquivos", *([caminho] if modo == "unico" else fragmentos)],
+            cwd=RAIZ, capture_output=True, text=True,
+        )
+        if filho.returncode != 0:
+            sys.exit(f"Falha no modo {modo}:\n{filho.stderr}")
+        resultado = json.loads(filho.stdout.strip().splitlines()[-1])
+        resultado.update(extras)
+        resultados.append(resultado)
+        guardar_resultado(args.resultados, resultado)
+
+    print(f"{args.linhas:,} linhas em {args.fragmentos} fragmentos · {os.cpu_count()} CPU(s) · motor {args.motor}"
+          + (f" · {args.banda_mb_s} MB/s por conexão" if args.banda_mb_s else ""))
+    print(f"{'modo':<9} {'carga s':>8} {'download s':>11} {'leitura s':>10} {'pico MB':>8}  base igual à do arquivo único")
+    referencia = resultados[0]
+    for r in resultados:
+        etapas = r["etapas_s"]
+        download = etapas.get("carga.baixar_fragmentos", etapas.get("carga.baixar", 0))
+        leitura = etapas.get("carga.ler_fragmentos", etapas.get("carga.ler_csv", etapas.get("duckdb.importar_csv", 0)))
+        igual = r["linhas"] == referencia["linhas"] and r["conteudo"] == referencia["conteudo"]
+        print(f"{r['modo']:<9} {r['carga_s']:>8.2f} {download:>11.2f} {leitura:>10.2f} {r['pico_rss_mb']:>8}  {igual}")
+    if not all(r["linhas"] == referencia["linhas"] and r["conteudo"] == referencia["conteudo"] for r in resultados):
+        sys.exit("A base montada dos fragmentos difere da do arquivo único")
+
+
+if __name__ == "__main__":
+    main()
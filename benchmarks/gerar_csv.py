@@ -0,0 +1,115 @@
+"""Gera CSVs sintéticos com as colunas da exportação de clientes da Olist.
+
+As distribuições imitam a base real: muitos clientes de 1ª compra e poucos recorrentes,
+estados concentrados no Sudeste, uma cauda longa de cidades, datas faltando ou impossíveis
+(31/02, 31/04) e texto sujo (espaços, caixa trocada) para exercitar a limpeza de base.derivar.
+
+    python -m benchmarks.gerar_csv 1000000 .cache/benchmarks/clientes-1000000.csv
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+NIVEIS = ["1ª Compra", "2ª Compra", "3ª Compra", "4ª Compra", "5ª Compra +"]
+PESOS_NIVEIS = [0.55, 0.2, 0.1, 0.07, 0.08]
+ESTADOS = ["SP", "RJ", "MG", "RS", "PR", "SC", "BA", "DF", "GO", "ES", "PE", "CE", "PA", "MT", "MS",
+           "MA", "PB", "RN", "PI", "AL", "SE", "TO", "RO", "AM", "AC", "AP", "RR"]
+PESOS_ESTADOS = np.array([42, 13, 12, 5.5, 5, 3.7, 3.4, 2.1, 2, 2, 1.6, 1.3, 1, 0.9, 0.7,
+                          0.7, 0.5, 0.5, 0.5, 0.4, 0.3, 0.3, 0.3, 0.3, 0.1, 0.1, 0.05])
+CAPITAIS = ["São Paulo", "Rio de Janeiro", "Belo Horizonte", "Porto Alegre", "Curitiba",
+            "Florianópolis", "Salvador", "Brasília", "Goiânia", "Vitória", "Recife", "Fortaleza"]
+CIDADES_CAUDA = 4000
+LINHAS_POR_LOTE = 500_000
+HOJE = pd.Timestamp("2025-06-30")
+# _DIAS[i] é a data i dias antes de HOJE; _HORAS[m] o horário " HH:MM" do minuto m do dia
+_DIAS = pd.date_range(end=HOJE, periods=100 * 366, freq="D")[::-1].strftime("%d/%m/%Y").to_numpy(dtype=object)
+_HORAS = np.array([f" {m // 60:02d}:{m % 60:02d}" for m in range(1440)], dtype=object)
+
+
+def _lote(rng, inicio, linhas):
+    niveis = rng.choice(len(NIVEIS), size=linhas, p=PESOS_NIVEIS)
+    confirmados = niveis + 1
+    recorrentes = niveis == len(NIVEIS) - 1
+    confirmados[recorrentes] += rng.geometric(0.3, size=recorrentes.sum()) - 1
+    so_cancelou = rng.random(linhas) < 0.04
+    confirmados[so_cancelou] = 0
+    cancelados = rng.poisson(0.15, size=linhas) + so_cancelou
+
+    estado = np.array(ESTADOS, dtype=object)[rng.choice(len(ESTADOS), size=linhas, p=PESOS_ESTADOS / PESOS_ESTADOS.sum())]
+    sujo = rng.random(linhas)
+    estado[sujo < 0.02] = np.char.lower(estado[sujo < 0.02].astype(str))
+    estado[(sujo >= 0.02) & (sujo < 0.03)] = ""
+
+    # Metade nas capitais, o resto numa cauda longa (zipf) de cidades menores
+    cidade = np.where(
+        rng.random(linhas) < 0.5,
+        np.array(CAPITAIS, dtype=object)[rng.integers(0, len(CAPITAIS), size=linhas)],
+        np.char.add("Cidade ", np.minimum(rng.zipf(1.3, size=linhas), CIDADES_CAUDA).astype(str)).astype(object),
+    )
+    cidade[sujo > 0.99] = cidade[sujo > 0.99] + " "
+    cidade[(sujo > 0.98) & (sujo <= 0.985)] = ""
+
+    genero = np.array(["Feminino", "Masculino", ""], dtype=object)[rng.choice(3, size=linhas, p=[0.62, 0.36, 0.02])]
+
+    # Datas formatadas por tabela (um strftime por dia/minuto distinto, não por linha)
+    idades = rng.normal(36, 11, size=linhas).clip(12, 95)
+    nascimento = _DIAS[(idades * 365.25).astype(int)]
+    nascimento[rng.random(linhas) < 0.05] = ""
+
+    atualizado = rng.integers(0, 3 * 365 * 24 * 60, size=linhas)
+    ultimo = atualizado + rng.integers(0, 60 * 24 * 30, size=linhas)
+    ultimo = _DIAS[ultimo // 1440] + _HORAS[1439 - ultimo % 1440]
+    ultimo[confirmados == 0] = ""
+    atualizado = _DIAS[atualizado // 1440] + _HORAS[1439 - atualizado % 1440]
+
+    # Datas que não existem no calendário: têm de virar NaT, não o começo do mês seguinte
+    impossivel = rng.random(linhas)
+    nascimento[impossivel < 0.002] = [f"31/02/{d[-4:]}" for d in nascimento[impossivel < 0.002]]
+    atualizado[impossivel > 0.999] = [f"31/04/{d[6:]}" for d in atualizado[impossivel > 0.999]]
+
+    ids = np.arange(inicio, inicio + linhas)
+    return pd.DataFrame({
+        "id_cliente": ids,
+        "nome": np.char.add("Cliente ", ids.astype(str)),
+        "classificacao": np.array(NIVEIS, dtype=object)[niveis],
+        "estado": estado,
+        "cidade": cidade,
+        "genero": genero,
+        "data_nascimento": nascimento,
+        "atualizado_em": atualizado,
+        "ultimo_pedido_confirmado": ultimo,
+        "pedidos_confirmados": confirmados,
+        "pedidos_cancelados": cancelados,
+    })
+
+
+def gerar(caminho, linhas, semente=42):
+    rng = np.random.default_rng(semente)
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    temporario = caminho + ".tmp"
+    # Escrita pelo Arrow: o to_csv do pandas levaria minutos para 10M linhas
+    with open(temporario, "wb") as destino:
+        destino.write("\ufeff".encode())  # BOM, como na exportação original
+        for inicio in range(0, linhas, LINHAS_POR_LOTE):
+            lote = pa.Table.from_pandas(_lote(rng, inicio, min(LINHAS_POR_LOTE, linhas - inicio)), preserve_index=False)
+            opcoes = pa_csv.WriteOptions(include_header=inicio == 0, quoting_style="needed")
+            pa_csv.write_csv(lote, destino, opcoes)
+    os.replace(temporario, caminho)
+    return caminho
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("linhas", type=int)
+    parser.add_argument("caminho")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+    gerar(args.caminho, args.linhas, args.semente)
+
+
+if __name__ == "__main__":
+    main()
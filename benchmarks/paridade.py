@@ -0,0 +1,85 @@
+"""Confere que o cubo em memória e o DuckDB dão os mesmos números sobre a mesma base.
+
+Lê o CSV sintético pelos dois caminhos de ingestão (carga.ler_csv + BaseClientes e
+consulta_duckdb.importar_csv + BaseDuckDB) e compara totais e agregações de cada seção
+para filtros combinados sorteados, incluindo seleções vazias. Sai com erro na primeira
+divergência, mostrando o filtro e as duas respostas.
+
+    python -m benchmarks.paridade --linhas 100000 --filtros 200
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+from benchmarks.executar import RAIZ, csv_sintetico
+
+AGRUPAMENTOS = [["classificacao"], ["estado"], ["cidade"], ["genero"], ["faixa"], ["mes"],
+                ["faixa", "genero"], ["mes", "faixa"], ["classificacao", "faixa"]]
+
+
+def _comparavel(resultado):
+    # Índices de tipos diferentes (categoria x texto) viram texto; sem linhas zeradas
+    if resultado.index.nlevels == 1 and resultado.index.name is None:
+        return {nome: int(valor) for nome, valor in resultado.items()}
+    linhas = resultado.reset_index()
+    chaves = [str(c) for c in resultado.index.names]
+    return {
+        tuple(str(linha[c]) for c in chaves): tuple(int(linha[m]) for m in resultado.columns)
+        for _, linha in linhas.iterrows() if linha["clientes"]
+    }
+
+
+def sortear_filtros(valores, n, semente):
+    rnd = random.Random(semente)
+    filtros = []
+    for _ in range(n):
+        selecoes = {dim: rnd.sample(opcoes, min(len(opcoes), rnd.choice([0, 0, 1, 1, 2, 3])))
+                    for dim, opcoes in valores.items()}
+        if rnd.random() < 0.1:
+            selecoes["cidade"] = ["CIDADE QUE NÃO EXISTE"]
+        filtros.append(selecoes)
+    return filtros
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--linhas", type=int, default=100_000)
+    parser.add_argument("--filtros", type=int, default=200)
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--dados", default=os.path.join(RAIZ, ".cache", "benchmarks"))
+    args = parser.parse_args()
+
+    import carga
+    import consulta_duckdb
+    from base import BaseClientes
+    from cubo import FILTRAVEIS, Filtro
+
+    caminho = csv_sintetico(args.dados, args.linhas)
+    with open(caminho, "rb") as arquivo:
+        cubo = BaseClientes(carga.ler_csv(arquivo), "paridade").cubo
+
+    with tempfile.TemporaryDirectory() as pasta:
+        consulta_duckdb.importar_csv(caminho, pasta)
+        duckdb = consulta_duckdb.BaseDuckDB(pasta, "paridade")
+
+        valores = {dim: [str(v) for v in cubo.agregar([dim]).index] for dim in FILTRAVEIS}
+        filtros = [Filtro()] + [Filtro.de(**s) for s in sortear_filtros(valores, args.filtros, args.semente)]
+        comparacoes = 0
+        for filtro in filtros:
+            consultas = [("totais", lambda motor: motor.totais(filtro))]
+            consultas += [(",".join(g), lambda motor, g=g: motor.agregar(g, filtro)) for g in AGRUPAMENTOS]
+            for nome, consultar in consultas:
+                esperado, obtido = _comparavel(consultar(cubo)), _comparavel(consultar(duckdb))
+                if esperado != obtido:
+                    so_cubo = {k: v for k, v in esperado.items() if obtido.get(k) != v} if nome != "totais" else esperado
+                    so_duckdb = {k: v for k, v in obtido.items() if esperado.get(k) != v} if nome != "totais" else obtido
+                    sys.exit(f"Divergência em {nome} com {filtro}:\n  cubo:   {so_cubo}\n  duckdb: {so_duckdb}")
+                comparacoes += 1
+
+    print(f"{args.linhas:,} linhas · {len(filtros)} filtros · {comparacoes} consultas iguais nos dois motores")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""Teste de carga: várias sessões simultâneas do dashboard pelo AppTest do Streamlit.
+
+Cada sessão roda o script real (dashboard_clientes.py) numa thread: abre a tela de login, entra
+pelo formulário de verificar_login, passa por todas as opções de nivel_radio e sai. As sessões
+dividem o processo como num servidor (cache_resource, atualizador, cache de figuras), e os dados
+vêm do Drive local servindo um CSV sintético. A primeira rodada começa sem snapshot em disco,
+como um deploy novo com todo mundo entrando junto; as seguintes já encontram tudo carregado.
+
+Mede a latência de cada rerun (p50/p95), o crescimento do RSS por sessão e quantos downloads
+chegaram ao "Drive". Com os limites --max-*, sai com código 1 quando algum é ultrapassado ou
+alguma sessão falha, para servir de portão de regressão. O AppTest sempre reexecuta o script
+inteiro, inclusive ao trocar o nível (no navegador só o fragmento do painel roda), então as
+latências são um teto do que o usuário vê.
+
+    python -m benchmarks.sessoes --sessoes 8 --linhas 100000
+    python -m benchmarks.sessoes --sessoes 20 --max-p95-ms 2000 --max-downloads 1
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from benchmarks.executar import RAIZ, _commit, csv_sintetico, guardar_resultado
+
+SCRIPT = os.path.join(RAIZ, "dashboard_clientes.py")
+RESULTADOS = os.path.join(RAIZ, ".cache", "benchmarks", "resultados-sessoes.jsonl")
+ID_LOGO = "logo-teste-carga"
+
+
+def _rss_mb():
+    # RSS atual (não o pico): é o que mostra memória retida pelas sessões
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _percentil(valores, p):
+    # Nearest-rank: sempre um valor observado, sem interpolar
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+@contextmanager
+def _apptest_em_threads():
+    # O AppTest supõe um run por vez no processo; duas adaptações para várias sessões em threads:
+    # - ele instala um Runtime global no início de cada run e o remove no fim, e o fim de uma
+    #   sessão tiraria o runtime de outra no meio do script. Aqui Runtime.instance() devolve o
+    #   último instalado, como no servidor, onde há um só;
+    # - cada run compila o script de novo, e no Python 3.11 o ast.parse em threads simultâneas
+    #   falha ("AST constructor recursion depth mismatch"); a compilação passa a ser serializada.
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    instance, exists = Runtime.__dict__["instance"], Runtime.__dict__["exists"]
+    get_bytecode = ScriptCache.get_bytecode
+    ultimo = []
+    trava = threading.Lock()
+
+    def instancia(cls):
+        if cls._instance is not None:
+            ultimo[:] = [cls._instance]
+        return ultimo[0] if ultimo else instance.__func__(cls)
+
+    def compilar(self, caminho):
+        with trava:
+            return get_bytecode(self, caminho)
+
+    Runtime.instance = classmethod(instancia)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or bool(ultimo))
+    ScriptCache.get_bytecode = compilar
+    try:
+        yield
+    finally:
+        Runtime.instance, Runtime.exists = instance, exists
+        ScriptCache.get_bytecode = get_bytecode
+
+
+def _secrets(caminho, valores, usuarios):
+    # TOML mínimo; strings JSON são strings básicas válidas em TOML
+    linhas = [f"{chave} = {json.dumps(valor)}" for chave, valor in valores.items()]
+    linhas.append("[usuarios]")
+    linhas += [f"{json.dumps(usuario)} = {json.dumps(senha)}" for usuario, senha in usuarios.items()]
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write("\n".join(linhas) + "\n")
+
+
+def _logo(caminho):
+    from PIL import Image
+    Image.new("RGB", (400, 400), "#d63aad").save(caminho)
+    return caminho
+
+
+class Sessao:
+    """Um usuário: login, todos os níveis e logout, guardando a duração de cada rerun."""
+
+    def __init__(self, usuario, senha, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.usuario = usuario
+        self.senha = senha
+        self.app = AppTest.from_file(SCRIPT, default_timeout=timeout)
+        self.reruns = []  # (ação, segundos)
+        self.erro = None
+
+    def _rodar(self, acao, elemento=None):
+        inicio = time.perf_counter()
+        (elemento or self.app).run()
+        self.reruns.append((acao, time.perf_counter() - inicio))
+        if self.app.exception:
+            raise RuntimeError(f"{acao}: {self.app.exception[0].message}")
+
+    def executar(self, largada):
+        try:
+            largada.wait()
+            self._rodar("login")
+            self.app.text_input(key="login_usuario").input(self.usuario)
+            self.app.text_input(key="login_senha").input(self.senha)
+            self._rodar("entrar", self.app.button(key="btn_entrar").click())
+            for nivel in self.app.radio(key="nivel_radio").options:
+                self._rodar("nivel", self.app.radio(key="nivel_radio").set_value(nivel))
+            self._rodar("sair", self.app.button(key="btn_sair").click())
+            if not self.app.text_input(key="login_usuario"):
+                raise RuntimeError("sair: a tela de login não voltou")
+        except Exception as e:
+            self.erro = f"{self.usuario}: {e}"
+
+
+def rodada(n_sessoes, timeout):
+    """N sessões largando juntas; o RSS final é medido com todas ainda vivas."""
+    usuarios = {f"usuario{i}": f"senha{i}" for i in range(n_sessoes)}
+    sessoes = [Sessao(usuario, senha, timeout) for usuario, senha in usuarios.items()]
+    largada = threading.Barrier(n_sessoes)
+    threads = [threading.Thread(target=s.executar, args=(largada,), name=f"sessao-{s.usuario}") for s in sessoes]
+
+    rss_inicial = _rss_mb()
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+    rss_final = _rss_mb()
+
+    reruns = [(acao, s) for sessao in sessoes for acao, s in sessao.reruns]
+    latencias = {}
+    for acao in ("login", "entrar", "nivel", "sair"):
+        tempos = [s for a, s in reruns if a == acao]
+        if tempos:
+            latencias[acao] = {"n": len(tempos), "p50_ms": round(_percentil(tempos, 50) * 1000, 1),
+                               "p95_ms": round(_percentil(tempos, 95) * 1000, 1)}
+    return {
+        "duracao_s": round(duracao, 2),
+        "latencias": latencias,
+        "rss_inicial_mb": round(rss_inicial),
+        "rss_por_sessao_mb": round((rss_final - rss_inicial) / n_sessoes, 2),
+        "erros": [s.erro for s in sessoes if s.erro],
+    }
+
+
+def testar(caminho_csv, n_sessoes, rodadas, motor, timeout):
+    from streamlit import config
+
+    from benchmarks.drive_local import DriveLocal
+
+    servidor = DriveLocal().iniciar()
+    with tempfile.TemporaryDirectory() as pasta:
+        link_base = servidor.adicionar(caminho_csv)
+        link_logo = servidor.adicionar(_logo(os.path.join(pasta, "logo.png")), ID_LOGO)
+        caminho_secrets = os.path.join(pasta, "secrets.toml")
+        _secrets(caminho_secrets, {
+            "GOOGLE_DRIVE_URL": link_base,
+            "DRIVE_DOWNLOAD_URL": servidor.url_download,
+            "LOGO_URL": link_logo,
+            "MOTOR_CONSULTA": motor,
+            "SNAPSHOT_DIR": os.path.join(pasta, "snapshots"),
+            "ATIVOS_DIR": os.path.join(pasta, "ativos"),
+            "METRICAS_ARQUIVO": "",
+        }, {f"usuario{i}": f"senha{i}" for i in range(n_sessoes)})
+        # Secrets por arquivo, e não por AppTest.secrets: este é trocado globalmente a cada run,
+        # o que não funciona com runs em paralelo nem é visto pelas threads de segundo plano
+        config.set_option("secrets.files", [caminho_secrets])
+
+        rss_inicial = _rss_mb()
+        with _apptest_em_threads():
+            rodadas = [rodada(n_sessoes, timeout) for _ in range(rodadas)]
+        servidor.parar()
+
+    id_base = next(id_arquivo for id_arquivo, caminho in servidor.arquivos.items() if caminho == caminho_csv)
+    return {
+        "sessoes": n_sessoes,
+        "motor": motor,
+        "rss_inicial_mb": round(rss_inicial),
+        "rodadas": rodadas,
+        "downloads_base": servidor.downloads_por_arquivo[id_base],
+        "nao_modificado": servidor.contadores["nao_modificado"],
+    }
+
+
+def _verificar(resultado, args):
+    # Os limites valem para a última rodada (processo já aquecido); downloads, para o teste todo
+    ultima = resultado["rodadas"][-1]
+    falhas = [erro for r in resultado["rodadas"] for erro in r["erros"]]
+    p95 = ultima["latencias"].get("nivel", {}).get("p95_ms")
+    if args.max_p95_ms is not None and p95 is not None and p95 > args.max_p95_ms:
+        falhas.append(f"p95 da troca de nível {p95} ms > {args.max_p95_ms} ms")
+    if args.max_rss_sessao_mb is not None and ultima["rss_por_sessao_mb"] > args.max_rss_sessao_mb:
+        falhas.append(f"RSS por sessão {ultima['rss_por_sessao_mb']} MB > {args.max_rss_sessao_mb} MB")
+    if args.max_downloads is not None and resultado["downloads_base"] > args.max_downloads:
+        falhas.append(f"{resultado['downloads_base']} downloads da base > {args.max_downloads}")
+    return falhas
+
+
+def _imprimir(resultado):
+    print(f"{resultado['sessoes']} sessões · motor {resultado['motor']} · {resultado['linhas']:,} linhas · "
+          f"{resultado['downloads_base']} download(s) da base · RSS inicial {resultado['rss_inicial_mb']} MB")
+    print(f"{'rodada':<7} {'duração s':>9} {'ação':<7} {'n':>4} {'p50 ms':>8} {'p95 ms':>8} {'MB/sessão':>10}")
+    for i, r in enumerate(resultado["rodadas"], 1):
+        for j, (acao, lat) in enumerate(r["latencias"].items()):
+            rodada_, duracao, rss = (i, f"{r['duracao_s']:.2f}", f"{r['rss_por_sessao_mb']:.2f}") if j == 0 else ("", "", "")
+            print(f"{rodada_:<7} {duracao:>9} {acao:<7} {lat['n']:>4} {lat['p50_ms']:>8.1f} {lat['p95_ms']:>8.1f} {rss:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessoes", type=int, default=8)
+    parser.add_argument("--rodadas", type=int, default=2, help="a primeira começa a frio")
+    parser.add_argument("--linhas", type=int, default=100_000)
+    parser.add_argument("--motor", choices=["pandas", "duckdb"], default="pandas")
+    parser.add_argument("--timeout", type=float, default=120, help="segundos por rerun")
+    parser.add_argument("--dados", default=os.path.join(RAIZ, ".cache", "benchmarks"))
+    parser.add_argument("--resultados", default=RESULTADOS)
+    parser.add_argument("--max-p95-ms", type=float)
+    parser.add_argument("--max-rss-sessao-mb", type=float)
+    parser.add_argument("--max-downloads", type=int)
+    args = parser.parse_args()
+
+    caminho = csv_sintetico(args.dados, args.linhas)
+    resultado = testar(caminho, args.sessoes, args.rodadas, args.motor, args.timeout)
+    resultado.update(linhas=args.linhas, commit=_commit(), data=datetime.now().isoformat(timespec="seconds"),
+                     python=platform.python_version())
+    guardar_resultado(args.resultados, resultado)
+    _imprimir(resultado)
+
+    falhas = _verificar(resultado, args)
+    for falha in falhas:
+        print(f"FALHOU: {falha}", file=sys.stderr)
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
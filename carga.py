@@ -0,0 +1,462 @@
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pandas.api.types import union_categoricals
+import requests
+
+from arquivos import escrita_atomica
+from drive import url_download
+from instrumentacao import contar, medir
+
+log = logging.getLogger(__name__)
+
+FORMATO_DATA_HORA = "%d/%m/%Y %H:%M"
+
+# Esquema declarado do CSV exportado da Olist; colunas ausentes no arquivo são ignoradas
+ESQUEMA = {
+    "classificacao":       "category",
+    "estado":              "category",
+    "cidade":              "category",
+    "genero":              "category",
+    "pedidos_confirmados": "Int32",
+    "pedidos_cancelados":  "Int32",
+}
+COLUNAS_DATA = {
+    "data_nascimento":          "%d/%m/%Y",
+    "atualizado_em":            FORMATO_DATA_HORA,
+    "ultimo_pedido_confirmado": FORMATO_DATA_HORA,
+}
+VERSAO_ESQUEMA = 2  # snapshots gravados com outro esquema são descartados
+LINHAS_POR_LOTE = 200_000
+TAMANHO_BLOCO = 1 << 20
+
+# ============================================================
+# GOOGLE DRIVE
+# ============================================================
+
+class CorpoResposta(io.RawIOBase):
+    """Expõe o corpo de uma resposta `stream=True` como arquivo, calculando o SHA-256 do que passa."""
+
+    def __init__(self, resposta):
+        self._blocos = resposta.iter_content(TAMANHO_BLOCO)
+        self._resto = b""
+        self.sha256 = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        while not self._resto:
+            bloco = next(self._blocos, None)
+            if bloco is None:
+                return 0
+            self.sha256.update(bloco)
+            self._resto = memoryview(bloco)
+        n = min(len(destino), len(self._resto))
+        destino[:n] = self._resto[:n]
+        self._resto = self._resto[n:]
+        return n
+
+
+@medir("carga.ler_csv")
+def ler_csv(arquivo):
+    # Lê em lotes: nunca existem ao mesmo tempo o texto inteiro e o frame com colunas object
+    lotes = []
+    for lote in pd.read_csv(arquivo, encoding="utf-8-sig", dtype=ESQUEMA, chunksize=LINHAS_POR_LOTE):
+        for coluna, formato in COLUNAS_DATA.items():
+            if coluna in lote.columns:
+                lote[coluna] = _converter_datas(lote[coluna], formato)
+        lotes.append(lote)
+    return concatenar(lotes)
+
+def _converter_datas(serie, formato):
+    # strptime do Arrow é bem mais rápido que pd.to_datetime com format, mas deixa o dia transbordar
+    # (31/02 vira 03/03; mês, hora e minuto fora da faixa já dão nulo). Só vale a data cujo dia é o
+    # do texto (os formatos de COLUNAS_DATA começam pelo dia); o resto passa pelo pd.to_datetime,
+    # que dá NaT para datas impossíveis e lixo
+    if not pd.api.types.is_string_dtype(serie):
+        return pd.to_datetime(serie, format=formato, errors="coerce")
+    texto = pa.array(serie, from_pandas=True)
+    datas = pc.strptime(texto, format=formato, unit="us", error_is_null=True)
+    dia = pc.cast(pc.struct_field(pc.extract_regex(texto, r"^(?P<dia>\d{1,2})/"), [0]), pa.int64())
+    confere = pc.fill_null(pc.equal(pc.day(datas), dia), False)
+    resultado = pd.Series(datas.to_numpy(zero_copy_only=False), index=serie.index, name=serie.name)
+    revisar = ~confere.to_numpy(zero_copy_only=False) & serie.notna().to_numpy()
+    if revisar.any():
+        resultado[revisar] = pd.to_datetime(serie[revisar], format=formato, errors="coerce")
+    return resultado
+
+def concatenar(partes):
+    if len(partes) == 1:
+        return partes[0]
+    # Cada parte tem suas próprias categorias; sem unificar, o concat voltaria para object
+    partes = list(partes)
+    for coluna in partes[0].columns:
+        if isinstance(partes[0][coluna].dtype, pd.CategoricalDtype):
+            categorias = union_categoricals([p[coluna] for p in partes], ignore_order=True).categories
+            if partes[0][coluna].cat.ordered:
+                categorias = partes[0][coluna].cat.categories.append(categorias.difference(partes[0][coluna].cat.categories))
+            else:
+                categorias = categorias.sort_values()
+            partes = [p.assign(**{coluna: p[coluna].cat.set_categories(categorias)}) for p in partes]
+    return pd.concat(partes, ignore_index=True)
+
+# ============================================================
+# SNAPSHOT EM DISCO
+# ============================================================
+
+def versao(meta):
+    # Sem deltas aplicados, a versão é o próprio hash do arquivo completo
+    return meta.get("versao") or meta["sha256"]
+
+
+@dataclass
+class Snapshot:
+    dados: object  # o que o store materializa: um DataFrame ou, no modo DuckDB, a base em Parquet
+    meta: dict
+    obsoleto: bool = False  # True quando o Drive falhou e servimos a última cópia boa
+    erro: str | None = None
+
+    @property
+    def salvo_em(self):
+        return datetime.fromisoformat(self.meta["salvo_em"])
+
+    @property
+    def validado_em(self):
+        # Última vez que o Drive confirmou estes dados (download ou 304); salvo_em só muda com conteúdo novo
+        return datetime.fromisoformat(self.meta.get("validado_em") or self.meta["salvo_em"])
+
+    @property
+    def versao(self):
+        return versao(self.meta)
+
+
+class SnapshotStore:
+    """Guarda o último CSV válido em Parquet, com hash/ETag/Last-Modified ao lado."""
+
+    # Chaves que o próprio store grava na meta; sobrevivem quando um download igual só renova a meta
+    CHAVES_PROPRIAS = ()
+
+    def __init__(self, diretorio, nome="clientes"):
+        self.diretorio = diretorio
+        self.caminho_dados = os.path.join(diretorio, f"{nome}.parquet")
+        self.caminho_meta = os.path.join(diretorio, f"{nome}.meta.json")
+        self._dados = None
+        self._versao = None
+
+    def ler_meta(self):
+        try:
+            with open(self.caminho_meta, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("esquema") != VERSAO_ESQUEMA:
+            return None
+        return meta if self._existe(meta) else None
+
+    def _existe(self, meta):
+        return os.path.exists(self.caminho_dados)
+
+    def importar(self, arquivo):
+        # Como o corpo baixado vira dados; subclasses podem, por exemplo, só gravá-lo em disco
+        return ler_csv(arquivo)
+
+    def importar_fragmentos(self, caminhos, processos):
+        # Fragmentos já baixados em disco (apagados depois): lidos em paralelo e juntados num frame só
+        return ler_fragmentos(caminhos, processos)
+
+    def descartar(self, dados):
+        pass
+
+    def ler(self, meta):
+        # Mantém os dados em memória enquanto a versão em disco não mudar
+        if self._versao != versao(meta):
+            self._dados = self._abrir(meta)
+            self._versao = versao(meta)
+        return self._dados
+
+    @medir("carga.abrir_snapshot")
+    def _abrir(self, meta):
+        return pd.read_parquet(self.caminho_dados)
+
+    @medir("carga.salvar_snapshot")
+    def salvar(self, df, meta):
+        os.makedirs(self.diretorio, exist_ok=True)
+        with escrita_atomica(self.caminho_dados) as f:
+            df.to_parquet(f, index=False)
+        self.salvar_meta(meta)
+        self._dados, self._versao = df, versao(meta)
+
+    def salvar_meta(self, meta):
+        os.makedirs(self.diretorio, exist_ok=True)
+        dados = json.dumps(meta, ensure_ascii=False, indent=2).encode("utf-8")
+        with escrita_atomica(self.caminho_meta) as f:
+            f.write(dados)
+
+
+def manter_obsoleto(anterior, erro):
+    # Atualização que falhou por outro motivo que não a rede (ex.: CSV ilegível): a versão atual
+    # segue no ar, marcada como obsoleta para o aviso aparecer no dashboard. Chamar dentro do except.
+    log.exception("Falha ao atualizar a base; mantendo a versão atual")
+    snapshot, dados = anterior
+    return replace(snapshot, obsoleto=True, erro=str(erro)), dados
+
+
+def snapshot_local(store):
+    # Sobe o processo "quente": usa o que está em disco sem tocar na rede
+    meta = store.ler_meta()
+    if meta is None:
+        return None
+    try:
+        return Snapshot(store.ler(meta), meta)
+    except (OSError, ValueError):
+        return None
+
+
+@medir("carga.baixar")
+def baixar_csv(url, headers=None, timeout=30, ler=ler_csv):
+    # Devolve None quando o servidor responde 304 (nada mudou desde o ETag/data enviados)
+    with requests.get(url_download(url), headers=headers or {}, timeout=timeout, stream=True) as r:
+        if r.status_code == 304:
+            contar("carga.nao_modificado")
+            return None
+        r.raise_for_status()
+        contar("carga.downloads")
+        corpo = CorpoResposta(r)
+        dados = ler(io.BufferedReader(corpo, TAMANHO_BLOCO))
+    return dados, corpo.sha256.hexdigest(), r.headers
+
+
+def carregar_com_snapshot(url, store, timeout=30, forcar=False):
+    # forcar=True ignora ETag e hash e reprocessa o arquivo inteiro (recarga completa)
+    if isinstance(url, Fragmentos):
+        return carregar_fragmentos(url, store, timeout, forcar)
+
+    meta = store.ler_meta()
+    headers = {}
+    if meta and not forcar:
+        headers = _condicional(meta)
+
+    try:
+        baixado = baixar_csv(url, headers, timeout, ler=store.importar)
+        if baixado is None and meta:
+            return _revalidado(store, meta)
+        if baixado is None:
+            raise requests.HTTPError("304 sem snapshot local para reaproveitar")
+    except requests.RequestException as e:
+        if meta is None:
+            raise
+        log.warning("Falha ao atualizar a base (%s); servindo o snapshot salvo em %s", e, meta["salvo_em"])
+        return Snapshot(store.ler(meta), meta, obsoleto=True, erro=str(e))
+
+    dados, sha256, resposta = baixado
+    return _guardar(store, meta, dados, {
+        "sha256": sha256,
+        "etag": resposta.get("ETag"),
+        "last_modified": resposta.get("Last-Modified"),
+    }, forcar)
+
+
+def _condicional(meta):
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
+
+
+def _revalidado(store, meta):
+    meta["validado_em"] = datetime.now().isoformat(timespec="seconds")
+    store.salvar_meta(meta)
+    return Snapshot(store.ler(meta), meta)
+
+
+def _guardar(store, meta, dados, novo_meta, forcar):
+    agora = datetime.now().isoformat(timespec="seconds")
+    novo_meta = {**novo_meta, "esquema": VERSAO_ESQUEMA, "salvo_em": agora, "validado_em": agora}
+
+    # Servidor sem ETag: o hash do conteúdo decide se a versão mudou.
+    # A versão gravada (que pode incluir deltas já aplicados) é mantida.
+    if meta and meta["sha256"] == novo_meta["sha256"] and not forcar:
+        for chave in ("salvo_em", "versao", "marca_dagua", *store.CHAVES_PROPRIAS):
+            if chave in meta:
+                novo_meta[chave] = meta[chave]
+        store.descartar(dados)
+        store.salvar_meta(novo_meta)
+        return Snapshot(store.ler(novo_meta), novo_meta)
+
+    store.salvar(dados, novo_meta)
+    return Snapshot(store.ler(novo_meta), novo_meta)
+
+# ============================================================
+# FRAGMENTOS (BASE EM VÁRIOS ARQUIVOS)
+# ============================================================
+
+class ErroFragmento(requests.RequestException):
+    """Um fragmento não pôde ser baixado; a carga inteira falha em vez de seguir com parte da base."""
+
+
+@dataclass
+class Fragmentos:
+    """Base exportada em vários CSVs com o mesmo esquema, baixados e lidos em paralelo.
+
+    Os links vêm de `urls` ou de um `manifesto` (arquivo texto com um link por linha, relido
+    a cada carga). A ordem dos fragmentos é a ordem das linhas na base montada.
+    """
+
+    urls: list = field(default_factory=list)
+    manifesto: str | None = None
+    downloads: int = 4  # downloads simultâneos
+    processos: int | None = None  # processos lendo CSV; None = um por CPU
+    tentativas: int = 3
+    espera: float = 1.0  # base do backoff exponencial entre tentativas, em segundos
+
+    def listar(self, timeout=30):
+        if not self.manifesto:
+            urls = list(self.urls)
+        else:
+            r = requests.get(url_download(self.manifesto), timeout=timeout)
+            r.raise_for_status()
+            urls = [linha.strip() for linha in r.text.splitlines() if linha.strip() and not linha.startswith("#")]
+        if not urls:
+            raise ValueError("Nenhum fragmento listado" + (f" no manifesto {self.manifesto}" if self.manifesto else ""))
+        return urls
+
+
+def _baixar_fragmento(fonte, rotulo, url, destino, headers, timeout):
+    # Erros de rede, 429 e 5xx são tentados de novo com espera crescente; outros 4xx falham na hora
+    for tentativa in range(1, fonte.tentativas + 1):
+        try:
+            with requests.get(url_download(url), headers=headers, timeout=timeout, stream=True) as r:
+                if r.status_code == 304:
+                    contar("carga.nao_modificado")
+                    return None
+                r.raise_for_status()
+                sha256 = hashlib.sha256()
+                with open(destino, "wb") as f:
+                    for bloco in r.iter_content(TAMANHO_BLOCO):
+                        sha256.update(bloco)
+                        f.write(bloco)
+            contar("carga.downloads")
+            return sha256.hexdigest(), r.headers
+        except requests.RequestException as e:
+            status = e.response.status_code if e.response is not None else None
+            if tentativa == fonte.tentativas or (status is not None and status < 500 and status != 429):
+                raise ErroFragmento(f"Fragmento {rotulo} ({url}) falhou após {tentativa} tentativa(s): {e}") from e
+            contar("carga.novas_tentativas")
+            time.sleep(fonte.espera * 2 ** (tentativa - 1) * random.uniform(0.5, 1.5))
+
+
+@medir("carga.baixar_fragmentos")
+def baixar_fragmentos(fonte, urls, caminhos, headers, timeout=30):
+    """Baixa cada url para o caminho correspondente, no máximo `fonte.downloads` por vez.
+
+    Devolve, na ordem das urls, (sha256, headers da resposta) ou None para os que responderam 304.
+    Na primeira falha os downloads ainda na fila são cancelados e o ErroFragmento sobe.
+    """
+    total = len(urls)
+    with ThreadPoolExecutor(max(1, fonte.downloads), thread_name_prefix="fragmento") as pool:
+        futuros = [
+            pool.submit(_baixar_fragmento, fonte, f"{i}/{total}", url, caminho, cabecalhos, timeout)
+            for i, (url, caminho, cabecalhos) in enumerate(zip(urls, caminhos, headers), 1)
+        ]
+        wait(futuros, return_when=FIRST_EXCEPTION)
+        falhas = [f.exception() for f in futuros if f.done() and not f.cancelled() and f.exception()]
+        if falhas:
+            for futuro in futuros:
+                futuro.cancel()
+            raise falhas[0]
+        return [futuro.result() for futuro in futuros]
+
+
+def _ler_fragmento(rotulo, caminho):
+    # Roda num processo separado; o erro volta com o fragmento identificado
+    try:
+        with open(caminho, "rb") as f:
+            return ler_csv(f)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Fragmento {rotulo} ilegível: {e}") from None
+
+
+def _contexto_processos():
+    # forkserver: os processos não herdam threads e travas do servidor (fork com threads pode travar).
+    # Ao subir, eles importam o __main__ como __mp_main__: o script do dashboard só desenha a página
+    # dentro de `if __name__ == "__main__"`
+    metodo = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(metodo)
+
+
+@medir("carga.ler_fragmentos")
+def ler_fragmentos(caminhos, processos=None):
+    total = len(caminhos)
+    rotulos = [f"{i}/{total}" for i in range(1, total + 1)]
+    processos = min(processos or os.cpu_count() or 1, total)
+    if processos <= 1:
+        partes = [_ler_fragmento(rotulo, caminho) for rotulo, caminho in zip(rotulos, caminhos)]
+    else:
+        with ProcessPoolExecutor(processos, mp_context=_contexto_processos()) as pool:
+            partes = list(pool.map(_ler_fragmento, rotulos, caminhos))
+
+    # Mesmo esquema declarado para todos, mas um fragmento com colunas a mais ou a menos não entra
+    for rotulo, parte in zip(rotulos, partes):
+        if list(parte.columns) != list(partes[0].columns):
+            raise ValueError(f"Fragmento {rotulo} com colunas diferentes do 1/{total}: "
+                             f"{sorted(set(parte.columns) ^ set(partes[0].columns))}")
+    return concatenar(partes)
+
+
+def carregar_fragmentos(fonte, store, timeout=30, forcar=False):
+    """Como carregar_com_snapshot, para uma base em fragmentos.
+
+    Cada fragmento é revalidado pelo próprio ETag; se nenhum mudou (e a lista é a mesma), o
+    snapshot é reaproveitado. Se algum mudou, os que responderam 304 são baixados de novo,
+    porque a base é remontada a partir de todos. Qualquer fragmento com erro derruba a carga
+    inteira: sobe ErroFragmento ou, havendo snapshot, ele é servido como obsoleto.
+    """
+    meta = store.ler_meta()
+    try:
+        urls = fonte.listar(timeout)
+        anteriores = {} if forcar or meta is None else {f["url"]: f for f in meta.get("fragmentos", [])}
+        os.makedirs(store.diretorio, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=store.diretorio, prefix="fragmentos-") as pasta:
+            caminhos = [os.path.join(pasta, f"{i}.csv") for i in range(len(urls))]
+            headers = [_condicional(anteriores[url]) if url in anteriores else {} for url in urls]
+            baixados = baixar_fragmentos(fonte, urls, caminhos, headers, timeout)
+            if meta and all(b is None for b in baixados) and list(anteriores) == urls:
+                return _revalidado(store, meta)
+
+            faltam = [i for i, b in enumerate(baixados) if b is None]
+            if faltam:
+                novos = baixar_fragmentos(fonte, [urls[i] for i in faltam], [caminhos[i] for i in faltam],
+                                          [{}] * len(faltam), timeout)
+                for i, baixado in zip(faltam, novos):
+                    baixados[i] = baixado
+            if any(b is None for b in baixados):
+                raise ErroFragmento("Fragmento respondeu 304 a um pedido sem ETag")
+            dados = store.importar_fragmentos(caminhos, fonte.processos)
+    except requests.RequestException as e:
+        if meta is None:
+            raise
+        log.warning("Falha ao atualizar a base (%s); servindo o snapshot salvo em %s", e, meta["salvo_em"])
+        return Snapshot(store.ler(meta), meta, obsoleto=True, erro=str(e))
+
+    fragmentos = [
+        {"url": url, "sha256": sha256, "etag": resposta.get("ETag"), "last_modified": resposta.get("Last-Modified")}
+        for url, (sha256, resposta) in zip(urls, baixados)
+    ]
+    sha256 = hashlib.sha256("\n".join(f["sha256"] for f in fragmentos).encode()).hexdigest()
+    return _guardar(store, meta, dados, {"sha256": sha256, "fragmentos": fragmentos}, forcar)
@@ -0,0 +1,226 @@
+import os
+import shutil
+import tempfile
+
+import duckdb
+import pandas as pd
+
+import carga
+from instrumentacao import medir
+from base import LIMITES_FAIXAS, ORDEM_FAIXAS
+from cubo import DIMENSOES, MEDIDAS, Consultas
+
+# Mesmas regras de base.derivar e cubo.medidas, em SQL
+_FAIXA = "CASE " + " ".join(
+    f"WHEN idade >= {inicio} AND idade < {fim} THEN '{rotulo}'"
+    for inicio, fim, rotulo in zip(LIMITES_FAIXAS, LIMITES_FAIXAS[1:], ORDEM_FAIXAS)
+) + " END"
+_MEDIDAS = """
+    count(*)                                                        AS clientes,
+    count_if(pedidos_confirmados > 0)                               AS compraram,
+    count_if(pedidos_confirmados >= 2)                              AS recorrentes,
+    count_if(pedidos_confirmados = 0 AND pedidos_cancelados > 0)    AS so_cancelamentos,
+    coalesce(sum(pedidos_confirmados), 0)                           AS pedidos
+"""
+
+
+def _ident(nome):
+    return '"' + nome.replace('"', '""') + '"'
+
+
+def _literal(texto):
+    return "'" + str(texto).replace("'", "''") + "'"
+
+
+def _arquivos(caminho_csv):
+    # Um CSV ou a lista dos fragmentos já baixados
+    return [caminho_csv] if isinstance(caminho_csv, str) else list(caminho_csv)
+
+
+@medir("duckdb.importar_csv")
+def importar_csv(caminho_csv, pasta, hoje=None):
+    """Converte o CSV (ou os fragmentos) em Parquet particionado por classificacao, já com as colunas derivadas.
+
+    Tudo roda dentro do DuckDB, que processa em streaming, lê vários arquivos em paralelo e usa
+    disco quando falta memória; o arquivo nunca passa inteiro por um DataFrame.
+    """
+    hoje = hoje or pd.Timestamp.now()
+    con = duckdb.connect()
+    try:
+        con.execute("SET preserve_insertion_order = false")
+        arquivos = "[" + ", ".join(_literal(c) for c in _arquivos(caminho_csv)) + "]"
+        origem = f"read_csv({arquivos}, header = true, all_varchar = true)"
+        colunas = con.sql(f"SELECT * FROM {origem} LIMIT 0").columns
+
+        selecao = []
+        for coluna in colunas:
+            c = _ident(coluna)
+            if coluna in carga.COLUNAS_DATA:
+                selecao.append(f"try_strptime({c}, '{carga.COLUNAS_DATA[coluna]}') AS {c}")
+            elif carga.ESQUEMA.get(coluna, "").startswith("Int"):
+                selecao.append(f"TRY_CAST({c} AS INTEGER) AS {c}")
+            elif coluna == "estado":
+                selecao.append(f"nullif(upper(trim({c}, ' \t\r\n')), '') AS {c}")
+            elif coluna == "cidade":
+                selecao.append(f"nullif(trim({c}, ' \t\r\n'), '') AS {c}")
+            else:
+                selecao.append(c)
+
+        derivadas = []
+        if "data_nascimento" in colunas:
+            derivadas.append(
+                "CAST(trunc(date_diff('day', data_nascimento, TIMESTAMP '"
+                + hoje.strftime("%Y-%m-%d %H:%M:%S") + "') / 365.25) AS SMALLINT) AS idade"
+            )
+        if "atualizado_em" in colunas:
+            derivadas.append("CAST(year(atualizado_em) * 100 + month(atualizado_em) AS INTEGER) AS mes")
+
+        consulta = f"SELECT *{''.join(', ' + d for d in derivadas)} FROM (SELECT {', '.join(selecao)} FROM {origem})"
+        if "data_nascimento" in colunas:
+            consulta = f"SELECT *, {_FAIXA} AS faixa FROM ({consulta})"
+        particao = " PARTITION_BY (classificacao)," if "classificacao" in colunas else ""
+        con.execute(f"COPY ({consulta}) TO {_literal(pasta)} (FORMAT parquet,{particao} OVERWRITE_OR_IGNORE true)")
+    finally:
+        con.close()
+
+
+class BaseDuckDB(Consultas):
+    """Base em Parquet particionado no disco, consultada pelo DuckDB.
+
+    Tem a mesma interface de consulta do Cubo (`totais`/`agregar`), então o dashboard não
+    sabe qual motor está por trás; só os resultados pequenos viram DataFrame.
+    """
+
+    def __init__(self, pasta, versao):
+        self.pasta = pasta
+        self.versao = versao
+        self._con = duckdb.connect()
+        self._origem = f"read_parquet({_literal(os.path.join(pasta, '**', '*.parquet'))}, hive_partitioning = true)"
+        colunas = self._con.sql(f"SELECT * FROM {self._origem} LIMIT 0").columns
+        self._iniciar([d for d in DIMENSOES if d in colunas])
+        self.colunas = colunas
+
+    @property
+    def cubo(self):
+        # Mesmo caminho de acesso que BaseClientes.cubo
+        return self
+
+    def __len__(self):
+        return int(self.totais()["clientes"])
+
+    def _consultar(self, sql, parametros):
+        # Um cursor por consulta: várias sessões podem consultar ao mesmo tempo
+        return self._con.cursor().execute(sql, parametros).df()
+
+    def _filtro(self, dimensoes, filtro):
+        # Sem índices próprios aqui: o DuckDB poda partições (classificacao) e row groups pelo
+        # min/max do Parquet a partir do IN de cada dimensão filtrada
+        condicoes = [f"{_ident(d)} IS NOT NULL" for d in dimensoes]
+        parametros = []
+        for dimensao, aceitos in filtro.selecoes:
+            condicoes.append(f"{_ident(dimensao)} IN ({', '.join('?' * len(aceitos))})")
+            parametros.extend(aceitos)
+        return (" WHERE " + " AND ".join(condicoes) if condicoes else ""), parametros
+
+    def _totais(self, filtro):
+        onde, parametros = self._filtro([], filtro)
+        resultado = self._consultar(f"SELECT {_MEDIDAS} FROM {self._origem}{onde}", parametros)
+        # Filtro sem nenhum cliente: count_if devolve NULL em vez de 0
+        return resultado.iloc[0][MEDIDAS].fillna(0).astype("int64")
+
+    def _agregar(self, dimensoes, filtro):
+        onde, parametros = self._filtro(dimensoes, filtro)
+        grupos = ", ".join(_ident(d) for d in dimensoes)
+        resultado = self._consultar(
+            f"SELECT {grupos}, {_MEDIDAS} FROM {self._origem}{onde} GROUP BY {grupos}", parametros
+        )
+        resultado[MEDIDAS] = resultado[MEDIDAS].astype("int64")
+        if "faixa" in dimensoes:
+            resultado["faixa"] = pd.Categorical(resultado["faixa"], categories=ORDEM_FAIXAS, ordered=True)
+        return resultado.set_index(dimensoes).sort_index()
+
+
+class ArmazemParquet(carga.SnapshotStore):
+    """Snapshot para o modo DuckDB: o CSV baixado vai direto para Parquet particionado.
+
+    Cada versão fica numa pasta própria; a anterior é mantida até a próxima troca para
+    não quebrar consultas que ainda estejam lendo os arquivos antigos.
+    """
+
+    CHAVES_PROPRIAS = ("pasta",)
+
+    def __init__(self, diretorio, nome="clientes"):
+        super().__init__(diretorio, nome)
+        self._prefixo = f"{nome}-"
+
+    def _existe(self, meta):
+        return "pasta" in meta and os.path.isdir(self._pasta(meta))
+
+    def importar(self, arquivo):
+        os.makedirs(self.diretorio, exist_ok=True)
+        fd, caminho = tempfile.mkstemp(dir=self.diretorio, suffix=".csv")
+        with os.fdopen(fd, "wb") as destino:
+            shutil.copyfileobj(arquivo, destino, carga.TAMANHO_BLOCO)
+        return caminho
+
+    def importar_fragmentos(self, caminhos, processos):
+        # Sem processos aqui: o DuckDB já lê os fragmentos em paralelo ao gerar o Parquet.
+        # Os arquivos saem da pasta temporária da carga para sobreviver até salvar/descartar.
+        destinos = []
+        for caminho in caminhos:
+            fd, destino = tempfile.mkstemp(dir=self.diretorio, suffix=".csv")
+            os.close(fd)
+            os.replace(caminho, destino)
+            destinos.append(destino)
+        return destinos
+
+    def descartar(self, caminho_csv):
+        for caminho in _arquivos(caminho_csv):
+            os.unlink(caminho)
+
+    def salvar(self, caminho_csv, meta):
+        anterior = self.ler_meta()
+        meta["pasta"] = f"{self._prefixo}{carga.versao(meta)[:16]}"
+        try:
+            shutil.rmtree(self._pasta(meta), ignore_errors=True)
+            importar_csv(caminho_csv, self._pasta(meta))
+        finally:
+            self.descartar(caminho_csv)
+        self.salvar_meta(meta)
+
+        # Além da versão anterior em disco, a que este processo ainda consulta nunca é apagada
+        manter = {meta["pasta"], anterior and anterior.get("pasta")}
+        if self._dados is not None:  # sem truthiness: len() de uma BaseDuckDB é um COUNT e pode dar 0
+            manter.add(os.path.basename(self._dados.pasta))
+        for nome in os.listdir(self.diretorio):
+            if nome.startswith(self._prefixo) and nome not in manter:
+                shutil.rmtree(os.path.join(self.diretorio, nome), ignore_errors=True)
+
+    def _abrir(self, meta):
+        return BaseDuckDB(self._pasta(meta), carga.versao(meta))
+
+    def _pasta(self, meta):
+        return os.path.join(self.diretorio, meta["pasta"])
+
+
+class CargaDuckDB:
+    """Carregador para o Atualizador no modo DuckDB (sem deltas: o arquivo completo é reimportado)."""
+
+    def __init__(self, url, armazem, timeout=30):
+        self.url = url
+        self.armazem = armazem
+        self.timeout = timeout
+
+    def __call__(self, anterior):
+        try:
+            return montar(carga.carregar_com_snapshot(self.url, self.armazem, self.timeout))
+        except Exception as e:
+            if anterior is None:
+                raise
+            return carga.manter_obsoleto(anterior, e)
+
+
+def montar(snapshot):
+    if snapshot is None:
+        return None
+    return snapshot, snapshot.dados
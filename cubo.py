@@ -0,0 +1,211 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from carga import concatenar
+from instrumentacao import contar, medir
+
+DIMENSOES = ["classificacao", "estado", "cidade", "genero", "faixa", "mes"]
+MEDIDAS = ["clientes", "compraram", "recorrentes", "so_cancelamentos", "pedidos"]
+FILTRAVEIS = ["classificacao", "estado", "cidade", "genero", "faixa"]
+LIMITE_CONSULTAS = 1024  # por versão; com filtros combinados o número de chaves possíveis não tem fim
+LIMITE_FATIAS = 8  # fatias são pedaços das células, bem maiores que uma agregação
+_VAZIO = np.empty(0, dtype=np.int32)
+
+
+@dataclass(frozen=True)
+class Filtro:
+    """Seleção do painel: valores aceitos por dimensão, OU dentro de uma dimensão e E entre elas.
+
+    Normalizado (dimensões e valores ordenados) e hashável: serve de chave nos caches de
+    consultas e de figuras. Vazio = base inteira.
+    """
+
+    selecoes: tuple = ()  # ((dimensão, (valor, ...)), ...)
+
+    @classmethod
+    def de(cls, **valores):
+        # Um valor ou uma lista por dimensão; None ou lista vazia não filtram
+        selecoes = []
+        for dimensao, aceitos in sorted(valores.items()):
+            aceitos = [aceitos] if isinstance(aceitos, str) else list(aceitos or [])
+            if aceitos:
+                selecoes.append((dimensao, tuple(sorted(set(aceitos), key=str))))
+        return cls(tuple(selecoes))
+
+    def sem(self, dimensao):
+        return Filtro(tuple(s for s in self.selecoes if s[0] != dimensao))
+
+    def __bool__(self):
+        return bool(self.selecoes)
+
+
+def medidas(df):
+    # Mesmas regras dos cards: pedidos ausentes não contam como comprou nem como "só cancelou"
+    confirmados = df["pedidos_confirmados"]
+    cancelados = df["pedidos_cancelados"]
+    return pd.DataFrame({
+        "clientes":         1,
+        "compraram":        (confirmados > 0).fillna(False).astype("int32"),
+        "recorrentes":      (confirmados >= 2).fillna(False).astype("int32"),
+        "so_cancelamentos": ((confirmados == 0) & (cancelados > 0)).fillna(False).astype("int32"),
+        "pedidos":          confirmados.fillna(0).astype("int64"),
+    }, index=df.index)
+
+
+def _agrupar(valores, df, dimensoes):
+    # dropna=False: clientes sem estado, faixa ou mês continuam nos totais
+    return (
+        valores
+        .groupby([df[d] for d in dimensoes], observed=True, dropna=False)
+        .sum()
+        .reset_index()
+    )
+
+
+class Consultas:
+    """Interface que o dashboard usa para cards e gráficos, com cache por (dimensões, filtro).
+
+    `totais(filtro)` devolve uma Series com as MEDIDAS; `agregar(dimensoes, filtro)` um DataFrame
+    indexado pelas dimensões, sem as linhas em que alguma delas está vazia. `filtro` é um Filtro
+    ou None (base inteira).
+    """
+
+    def _iniciar(self, dimensoes):
+        self.dimensoes = dimensoes
+        self._cache = OrderedDict()
+        self._trava = threading.Lock()
+
+    def totais(self, filtro=None):
+        filtro = filtro or Filtro()
+        return self._memo(("totais", filtro), "totais", lambda: self._totais(filtro))
+
+    def agregar(self, dimensoes, filtro=None):
+        dimensoes = list(dimensoes)
+        filtro = filtro or Filtro()
+        return self._memo((tuple(dimensoes), filtro), f"agregar[{','.join(dimensoes)}]",
+                          lambda: self._agregar(dimensoes, filtro))
+
+    def _memo(self, chave, nome, calcular, cache=None, limite=LIMITE_CONSULTAS):
+        # `nome` identifica a consulta nos tempos e contadores (sem o filtro, para não multiplicar séries)
+        cache = self._cache if cache is None else cache
+        with self._trava:
+            resultado = cache.get(chave)
+            if resultado is not None:
+                cache.move_to_end(chave)
+        if resultado is None:
+            contar("consultas.faltas")
+            with medir(f"consulta.{nome}"):
+                resultado = calcular()
+            with self._trava:
+                resultado = cache.setdefault(chave, resultado)
+                while len(cache) > limite:
+                    cache.popitem(last=False)
+        else:
+            contar("consultas.acertos")
+        return resultado
+
+
+class IndiceCelulas:
+    """Posições das células do cubo por valor de cada dimensão filtrável, montadas uma vez por versão.
+
+    Cruzar filtros parte da dimensão mais seletiva e só procura as posições dela nas outras:
+    o custo acompanha o tamanho da seleção, não o do cubo.
+    """
+
+    @medir("cubo.indexar")
+    def __init__(self, celulas, dimensoes):
+        self.posicoes = {
+            d: {valor: posicoes.astype(np.int32)
+                for valor, posicoes in celulas[d].groupby(celulas[d], observed=True, sort=False).indices.items()}
+            for d in dimensoes
+        }
+
+    def selecionar(self, filtro):
+        # Por dimensão, uma lista ordenada por valor aceito; uma célula tem um só valor por
+        # dimensão, então as listas de uma dimensão nunca se repetem. Só a menor dimensão é
+        # unida; as outras apenas respondem se contêm cada posição já selecionada.
+        dimensoes = sorted(
+            ([self.posicoes[dimensao].get(valor, _VAZIO) for valor in aceitos] for dimensao, aceitos in filtro.selecoes),
+            key=lambda listas: sum(map(len, listas)),
+        )
+        menor = dimensoes[0]
+        selecionadas = menor[0] if len(menor) == 1 else np.sort(np.concatenate(menor))
+        for listas in dimensoes[1:]:
+            if not len(selecionadas):
+                break
+            manter = np.zeros(len(selecionadas), dtype=bool)
+            for lista in listas:
+                manter |= _contem(lista, selecionadas)
+            selecionadas = selecionadas[manter]
+        return selecionadas
+
+
+def _contem(ordenada, valores):
+    # Busca binária: custo proporcional a len(valores), não ao tamanho da lista
+    if not len(ordenada):
+        return np.zeros(len(valores), dtype=bool)
+    onde = np.minimum(np.searchsorted(ordenada, valores), len(ordenada) - 1)
+    return ordenada[onde] == valores
+
+
+class Cubo(Consultas):
+    """Contagens e somas pré-agregadas por classificacao × estado × cidade × genero × faixa × mes.
+
+    É montado uma vez por versão da base; cards e gráficos leem daqui em vez de varrer as linhas.
+    Cada combinação (dimensões, filtro) é agregada só na primeira vez e depois vem do cache;
+    as células de um filtro saem do IndiceCelulas, montado junto com o cubo.
+    """
+
+    @medir("cubo.montar")
+    def __init__(self, df):
+        self._iniciar([d for d in DIMENSOES if d in df.columns])
+        self._definir_celulas(_agrupar(medidas(df), df, self.dimensoes))
+
+    def _definir_celulas(self, celulas):
+        self.celulas = celulas
+        self.indice = IndiceCelulas(celulas, [d for d in FILTRAVEIS if d in self.dimensoes])
+        self._fatias = OrderedDict()
+
+    def com_delta(self, removidos, adicionados):
+        # Tira a contribuição das linhas antigas, soma a das novas e reagrupa só as células
+        partes = [
+            self.celulas,
+            _agrupar(-medidas(removidos), removidos, self.dimensoes),
+            _agrupar(medidas(adicionados), adicionados, self.dimensoes),
+        ]
+        juntas = concatenar(partes)
+        celulas = _agrupar(juntas[MEDIDAS], juntas, self.dimensoes)
+        novo = Cubo.__new__(Cubo)
+        novo._iniciar(self.dimensoes)
+        novo._definir_celulas(celulas[celulas["clientes"] > 0].reset_index(drop=True))
+        return novo
+
+    def diferencas(self, outro):
+        # Células que não batem entre dois cubos (ex.: incremental x recarga completa)
+        a = self.celulas.set_index(self.dimensoes)[MEDIDAS]
+        b = outro.celulas.set_index(outro.dimensoes)[MEDIDAS]
+        juntos = a.join(b, how="outer", lsuffix="_a", rsuffix="_b").fillna(0)
+        diferente = pd.Series(False, index=juntos.index)
+        for medida in MEDIDAS:
+            diferente |= juntos[f"{medida}_a"] != juntos[f"{medida}_b"]
+        return juntos[diferente]
+
+    def __len__(self):
+        return len(self.celulas)
+
+    def fatia(self, filtro=None):
+        if not filtro:
+            return self.celulas
+        return self._memo(filtro, "fatia", lambda: self.celulas.take(self.indice.selecionar(filtro)),
+                          cache=self._fatias, limite=LIMITE_FATIAS)
+
+    def _totais(self, filtro):
+        return self.fatia(filtro)[MEDIDAS].sum()
+
+    def _agregar(self, dimensoes, filtro):
+        # Células com alguma dimensão vazia saem aqui, como no value_counts/groupby de antes
+        return self.fatia(filtro).groupby(dimensoes, observed=True)[MEDIDAS].sum()
@@ -0,0 +1,10 @@
+# Links do Google Drive; módulo leve, usado também pela tela de login (sem pandas)
+DRIVE_DOWNLOAD_URL = "https://drive.google.com/uc?export=download&id={file_id}"
+
+
+def id_arquivo_drive(url):
+    return url.split("/d/")[1].split("/")[0]
+
+
+def url_download(url):
+    return DRIVE_DOWNLOAD_URL.format(file_id=id_arquivo_drive(url))
@@ -0,0 +1,72 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from instrumentacao import contar
+
+# Layout comum a todos os gráficos; cada figura só define o que é dela (margens, títulos, legenda).
+# Vai no layout da figura (fig.update_layout), não num template: o tema do st.plotly_chart é
+# aplicado por cima do template e ganharia dele.
+LAYOUT = dict(
+    paper_bgcolor="white",
+    plot_bgcolor="white",
+    font=dict(color="#3d2e6b", family="Sora"),
+    xaxis=dict(showgrid=False),
+    yaxis=dict(gridcolor="#f5f0ff"),
+)
+
+
+@dataclass
+class MetricasRerun:
+    acertos: int = 0
+    faltas: int = 0
+    bytes: int = 0  # tamanho do JSON das figuras enviadas ao navegador neste rerun
+
+
+class CacheFiguras:
+    """Figuras prontas por (versão da base, filtro, id do gráfico), com LRU e teto de memória.
+
+    O tamanho de cada entrada é o do JSON que o Streamlit manda ao navegador, medido uma vez.
+    """
+
+    def __init__(self, limite_bytes):
+        self.limite_bytes = limite_bytes
+        self._itens = OrderedDict()
+        self._bytes = 0
+        self._trava = threading.Lock()
+
+    @property
+    def bytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._itens)
+
+    def obter(self, chave, montar, metricas=None):
+        # Devolve (figura, tamanho em bytes); `montar` só roda quando a chave não está no cache
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is not None:
+                self._itens.move_to_end(chave)
+        acerto = item is not None
+
+        if not acerto:
+            fig = montar()
+            item = (fig, len(fig.to_json()))
+            with self._trava:
+                if chave not in self._itens:
+                    self._itens[chave] = item
+                    self._bytes += item[1]
+                    self._despejar()
+
+        contar("figuras.acertos" if acerto else "figuras.faltas")
+        if metricas is not None:
+            metricas.acertos += acerto
+            metricas.faltas += not acerto
+            metricas.bytes += item[1]
+        return item
+
+    def _despejar(self):
+        while self._bytes > self.limite_bytes and len(self._itens) > 1:
+            _, (_, tamanho) = self._itens.popitem(last=False)
+            self._bytes -= tamanho
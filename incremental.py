@@ -0,0 +1,138 @@
+import hashlib
+import logging
+from dataclasses import replace
+
+import requests
+
+import carga
+from base import montar
+
+log = logging.getLogger(__name__)
+
+CHAVE_CLIENTE = "id_cliente"
+
+
+class DeltaInvalido(ValueError):
+    """Delta que não pôde ser lido ou aplicado; fica de fora até o arquivo mudar (novo ETag)."""
+
+    def __init__(self, url, etag, erro):
+        super().__init__(f"Delta inválido ({url}): {erro}")
+        self.url = url
+        self.etag = etag
+
+
+def verificar_consistencia(incremental, completa):
+    # Devolve as células do cubo em que a base montada por deltas diverge da recarga completa
+    diferencas = incremental.cubo.diferencas(completa.cubo)
+    if len(incremental) != len(completa):
+        log.warning("Base incremental com %d clientes, recarga completa com %d", len(incremental), len(completa))
+    if len(diferencas):
+        log.warning("Base incremental diverge da recarga completa em %d células do cubo", len(diferencas))
+    return diferencas
+
+
+def _ler_delta(arquivo):
+    # O erro volta como valor para o ETag da resposta ainda poder ser registrado
+    try:
+        return carga.ler_csv(arquivo)
+    except ValueError as e:
+        return e
+
+
+class CargaIncremental:
+    """Carregador para o Atualizador: arquivo completo + deltas por `atualizado_em`.
+
+    A cada ciclo o arquivo completo é revalidado (ETag/hash, normalmente um 304) e os
+    CSVs de delta são aplicados por upsert sobre a base atual. A cada `recarga_a_cada`
+    ciclos, ou quando um delta é inválido, a base é reconstruída do zero e comparada com a
+    versão incremental. Se um delta não pode ser baixado, o ciclo não aplica nenhum e a
+    base atual segue marcada como obsoleta até o próximo.
+    """
+
+    def __init__(self, url, store, urls_delta=(), chave=CHAVE_CLIENTE, recarga_a_cada=24, timeout=30):
+        self.url = url
+        self.store = store
+        self.urls_delta = list(urls_delta)
+        self.chave = chave
+        self.recarga_a_cada = recarga_a_cada
+        self.timeout = timeout
+        self._etags = {}  # url -> ETag do delta já aplicado à base atual
+        self._invalidos = {}  # url -> ETag do delta inválido, que só é relido quando mudar
+        self._ciclos = 0
+
+    def __call__(self, anterior):
+        self._ciclos += 1
+        recarga = anterior is not None and bool(self.urls_delta) and self._ciclos % self.recarga_a_cada == 0
+        try:
+            try:
+                return self._carregar(anterior, recarga)
+            except DeltaInvalido as e:
+                if anterior is None:
+                    raise
+                self._invalidos[e.url] = e.etag
+                log.exception("Falha ao aplicar delta; refazendo a carga completa sem deltas")
+                return self._carregar(anterior, recarga=True, com_deltas=False)
+        except Exception as e:
+            # Arquivo completo ilegível (ou a recarga sem deltas falhou): nada de baixar de novo agora
+            if anterior is None:
+                raise
+            return carga.manter_obsoleto(anterior, e)
+
+    def _carregar(self, anterior, recarga, com_deltas=True):
+        snapshot, base = montar(carga.carregar_com_snapshot(self.url, self.store, self.timeout, forcar=recarga), anterior)
+        if not self.urls_delta:
+            return snapshot, base
+        if not com_deltas:
+            # Base sem nenhum delta: os válidos precisam ser reaplicados inteiros no próximo ciclo
+            self._etags.clear()
+            return snapshot, base
+
+        # Base nova (arquivo completo mudou ou recarga): os deltas precisam ser reaplicados inteiros
+        reaplicar = anterior is None or base is not anterior[1]
+        try:
+            baixados = [self._baixar_delta(url, reaplicar) for url in self.urls_delta]
+        except requests.RequestException as e:
+            return self._sem_deltas(snapshot, base, anterior, e)
+        deltas = [d for d in baixados if d is not None]
+        atualizada = self._aplicar(base, deltas)
+
+        if recarga:
+            verificar_consistencia(self._aplicar(anterior[1], deltas), atualizada)
+        # Só agora, com todos aplicados, os ETags passam a valer para os próximos ciclos
+        self._etags.update({url: etag for url, _, _, etag in deltas})
+        if atualizada is base:
+            return snapshot, base
+
+        meta = {**snapshot.meta, "versao": atualizada.versao, "marca_dagua": str(atualizada.marca_dagua)}
+        self.store.salvar(atualizada.df, meta)
+        return replace(snapshot, dados=atualizada.df, meta=meta), atualizada
+
+    def _sem_deltas(self, snapshot, base, anterior, erro):
+        # Nenhum delta entra neste ciclo: aplicar só os que chegaram avançaria a marca d'água e as
+        # linhas do que faltou seriam descartadas depois. Sem ETags novos, todos são relidos no próximo.
+        log.warning("Falha ao baixar delta (%s); mantendo a base sem os deltas deste ciclo", erro)
+        if anterior is not None and base is not anterior[1]:
+            snapshot, base = anterior  # arquivo completo novo, ainda sem os deltas: segue a versão atual
+        return replace(snapshot, obsoleto=True, erro=str(erro)), base
+
+    def _aplicar(self, base, deltas):
+        for url, df, sha256, etag in deltas:
+            versao = hashlib.sha256(f"{base.versao}:{sha256}".encode()).hexdigest()
+            try:
+                base = base.com_delta(df, self.chave, versao)
+            except Exception as e:
+                raise DeltaInvalido(url, etag, e) from e
+        return base
+
+    def _baixar_delta(self, url, reaplicar):
+        # Um delta inválido só volta a ser lido quando mudar, mesmo quando os outros são reaplicados
+        etag = self._invalidos.get(url) or (None if reaplicar else self._etags.get(url))
+        headers = {"If-None-Match": etag} if etag else {}
+        baixado = carga.baixar_csv(url, headers, self.timeout, ler=_ler_delta)
+        if baixado is None:
+            return None
+        df, sha256, resposta = baixado
+        if isinstance(df, ValueError):
+            raise DeltaInvalido(url, resposta.get("ETag"), df)
+        self._invalidos.pop(url, None)
+        return url, df, sha256, resposta.get("ETag")
@@ -0,0 +1,118 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from arquivos import escrita_atomica
+
+PREFIXO = "dashboard_clientes"
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    contagem: int = 0
+    total: float = 0.0
+    ultimo: float = 0.0
+    maximo: float = 0.0
+
+
+def _rotulo(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Registro:
+    """Tempos por etapa, contadores de cache e informações da base, por processo.
+
+    É alimentado de qualquer thread (sessões e atualizador em segundo plano) e exportado no
+    formato texto do Prometheus, para o textfile collector ou para comparar entre versões.
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self.spans = {}
+        self.contadores = Counter()
+        self.info = {}
+
+    @contextmanager
+    def medir(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nome, time.perf_counter() - inicio)
+
+    def registrar(self, nome, segundos):
+        with self._trava:
+            span = self.spans.setdefault(nome, Span())
+            span.contagem += 1
+            span.total += segundos
+            span.ultimo = segundos
+            span.maximo = max(span.maximo, segundos)
+
+    def contar(self, nome, n=1):
+        with self._trava:
+            self.contadores[nome] += n
+
+    def definir(self, **valores):
+        with self._trava:
+            self.info.update(valores)
+
+    def resumo(self):
+        with self._trava:
+            spans = {nome: Span(**vars(span)) for nome, span in self.spans.items()}
+            return spans, dict(self.contadores), dict(self.info)
+
+    def prometheus(self):
+        spans, contadores, info = self.resumo()
+        linhas = [
+            f"# HELP {PREFIXO}_span_segundos Duração das etapas instrumentadas.",
+            f"# TYPE {PREFIXO}_span_segundos summary",
+        ]
+        for nome, span in sorted(spans.items()):
+            linhas.append(f'{PREFIXO}_span_segundos_sum{{span="{_rotulo(nome)}"}} {span.total:.6f}')
+            linhas.append(f'{PREFIXO}_span_segundos_count{{span="{_rotulo(nome)}"}} {span.contagem}')
+        linhas.append(f"# TYPE {PREFIXO}_span_maximo_segundos gauge")
+        for nome, span in sorted(spans.items()):
+            linhas.append(f'{PREFIXO}_span_maximo_segundos{{span="{_rotulo(nome)}"}} {span.maximo:.6f}')
+        linhas.append(f"# TYPE {PREFIXO}_eventos_total counter")
+        for nome, valor in sorted(contadores.items()):
+            linhas.append(f'{PREFIXO}_eventos_total{{evento="{_rotulo(nome)}"}} {valor}')
+        # Números viram gauges próprios; textos (versão, motor) viram rótulos de uma série _info
+        numeros = {chave: valor for chave, valor in info.items() if isinstance(valor, (int, float))}
+        textos = {chave: valor for chave, valor in info.items() if chave not in numeros}
+        for chave, valor in sorted(numeros.items()):
+            linhas.append(f"# TYPE {PREFIXO}_base_{chave} gauge")
+            linhas.append(f"{PREFIXO}_base_{chave} {valor}")
+        if textos:
+            rotulos = ",".join(f'{chave}="{_rotulo(valor)}"' for chave, valor in sorted(textos.items()))
+            linhas.append(f"# TYPE {PREFIXO}_base_info gauge")
+            linhas.append(f"{PREFIXO}_base_info{{{rotulos}}} 1")
+        return "\n".join(linhas) + "\n"
+
+    def exportar(self, caminho):
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        with escrita_atomica(caminho) as destino:
+            destino.write(self.prometheus().encode("utf-8"))
+
+    def exportar_a_cada(self, caminho, intervalo):
+        # Uma thread por processo reescreve o arquivo; as sessões só alimentam o registro em memória
+        def exportar():
+            while True:
+                try:
+                    self.exportar(caminho)
+                except OSError:
+                    log.exception("Falha ao exportar métricas para %s", caminho)
+                time.sleep(intervalo)
+
+        thread = threading.Thread(target=exportar, name="exportar-metricas", daemon=True)
+        thread.start()
+        return thread
+
+
+registro = Registro()
+medir = registro.medir
+contar = registro.contar